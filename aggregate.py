@@ -0,0 +1,217 @@
+"""
+Author: Sobhan
+Date: 17-10-2026
+Project: Bones Ltd. job technical challenge.
+File: aggregate.py
+Description and Usage:
+   Aggregates the Parquet results of batch.py (one part file per
+   transcript) over any number of transcripts, e.g. a month of calls.
+   Every part file is read in batches of rows, so memory use does not
+   grow with the number of messages, and reduced to additive partial
+   sums per (transcript, speaker, day): messages, positive messages,
+   sentiment score, filler ratio, words and turns. The per-speaker,
+   per-transcript and per-day metrics of the dashboard (total and mean
+   sentiment, average filler ratio, messages per turn, ...) are then
+   derived from these small partials.
+   The day of a part is the date of the batch run that wrote it (run_date
+   in its metadata, see batch.py), not a file modification time; parts
+   without it (written by older versions) use their date column.
+   The partials are kept next to the results (_aggregates.parquet, which
+   pd.read_parquet('results/') ignores) with the size and modification
+   time of every part, so an update only reads the parts that are new or
+   were rewritten since the last one.
+
+   Usage:
+      from aggregate import get_aggregates
+      store = get_aggregates('results')     # updated incrementally
+      store.per_speaker(), store.per_transcript(), store.per_day()
+
+   Suggested run command:
+      > python aggregate.py results/
+"""
+
+import argparse
+import datetime
+import glob
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+import perf
+
+# the additive partial sums kept per (transcript, speaker, date)
+KEYS = ['transcript', 'speaker', 'date']
+SUMS = ['messages', 'positive', 'sentiment_score', 'filler_words_ratio', 'words', 'turns']
+# derived metrics, see metrics()
+METRICS = ['messages', 'total_sentiment', 'mean_sentiment', 'positive_share',
+           'filler_words_ratio', 'mean_message_length', 'messages_per_turn']
+
+_READ_COLUMNS = ['transcript', 'speaker', 'message', 'sentiment', 'score',
+                 'filler_words_ratio', 'date']
+
+
+def part_run_date(parquet_file):
+    '''Returns the date of the batch run that wrote a part (a
+    pyarrow.parquet.ParquetFile), None if it is not recorded.'''
+    run_date = (parquet_file.schema_arrow.metadata or {}).get(b'run_date')
+    return datetime.date.fromisoformat(run_date.decode()) if run_date else None
+
+
+def part_partials(path, batch_size=65536):
+    '''Reads a part file batch by batch and returns its partial sums per
+    (transcript, speaker, date) as a DataFrame (KEYS + SUMS). The date is
+    the part's batch run date (see part_run_date).'''
+    import pyarrow.parquet as pq
+    partials = []
+    last_speaker = None
+    parquet_file = pq.ParquetFile(path)
+    run_date = part_run_date(parquet_file)
+    for batch in parquet_file.iter_batches(batch_size=batch_size, columns=_READ_COLUMNS):
+        df = batch.to_pandas()
+        if df.empty:
+            continue
+        positive = df['sentiment'] == 'POSITIVE'
+        speaker = df['speaker']
+        # a turn starts when the speaker changes, also across batches
+        previous = speaker.shift(fill_value=last_speaker)
+        last_speaker = speaker.iloc[-1]
+        partials.append(pd.DataFrame({
+            'transcript': df['transcript'], 'speaker': speaker,
+            'date': df['date'] if run_date is None else run_date,
+            'messages': 1,
+            'positive': positive.astype(int),
+            'sentiment_score': np.where(positive, df['score'], -df['score']),
+            'filler_words_ratio': df['filler_words_ratio'],
+            'words': df['message'].str.split().str.len().fillna(0).astype(int),
+            'turns': (speaker != previous).astype(int),
+        }).groupby(KEYS, as_index=False, observed=True)[SUMS].sum())
+    if not partials:
+        return pd.DataFrame(columns=KEYS + SUMS)
+    return pd.concat(partials).groupby(KEYS, as_index=False, observed=True)[SUMS].sum()
+
+
+def metrics(partials, by):
+    '''Sums the partials by the columns `by` and returns the METRICS.'''
+    sums = partials.groupby(by, as_index=False, observed=True)[SUMS].sum()
+    messages = sums['messages'].where(sums['messages'] > 0)
+    return pd.DataFrame({
+        **{col: sums[col] for col in by},
+        'messages': sums['messages'],
+        'total_sentiment': sums['sentiment_score'],
+        'mean_sentiment': sums['sentiment_score'] / messages,
+        'positive_share': sums['positive'] / messages,
+        'filler_words_ratio': sums['filler_words_ratio'] / messages,
+        'mean_message_length': sums['words'] / messages,
+        'messages_per_turn': sums['messages'] / sums['turns'].where(sums['turns'] > 0),
+    })
+
+
+class AggregateStore:
+    '''The partial sums of all part files in a results directory.'''
+
+    def __init__(self, results_dir):
+        self.results_dir = results_dir
+        self.partials_path = os.path.join(results_dir, '_aggregates.parquet')
+        self.manifest_path = os.path.join(results_dir, '_aggregates.json')
+        self._lock = threading.Lock()
+        self.manifest = {}
+        self.partials = pd.DataFrame(columns=['part'] + KEYS + SUMS)
+        if os.path.exists(self.partials_path) and os.path.exists(self.manifest_path):
+            self.partials = pd.read_parquet(self.partials_path)
+            with open(self.manifest_path, encoding='utf-8') as f:
+                self.manifest = json.load(f)
+
+    def update(self):
+        '''Reads the part files that are new or changed since the last
+        update (and drops the removed ones). Returns the updated parts.'''
+        with self._lock:
+            parts = {}
+            for path in glob.glob(os.path.join(self.results_dir, '*.parquet')):
+                name = os.path.basename(path)
+                if name.startswith('_'):
+                    continue
+                stat = os.stat(path)
+                parts[name] = [stat.st_size, stat.st_mtime_ns]
+            changed = sorted(name for name, sig in parts.items() if self.manifest.get(name) != sig)
+            removed = [name for name in self.manifest if name not in parts]
+            if not changed and not removed:
+                return []
+
+            with perf.stage("aggregate", parts=len(changed)):
+                new = []
+                for name in changed:
+                    partials = part_partials(os.path.join(self.results_dir, name))
+                    partials.insert(0, 'part', name)
+                    new.append(partials)
+                keep = self.partials[~self.partials['part'].isin(changed + removed)]
+                frames = [frame for frame in [keep] + new if len(frame)]
+                self.partials = (pd.concat(frames, ignore_index=True) if frames
+                                 else keep.iloc[:0])
+                self.manifest = {name: parts[name] for name in parts}
+                self._save()
+            return changed
+
+    def _save(self):
+        # the partials first: after a crash between the two writes the
+        # parts are only read again
+        self.partials.to_parquet(self.partials_path + '.tmp', index=False)
+        os.replace(self.partials_path + '.tmp', self.partials_path)
+        with open(self.manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f)
+        os.replace(self.manifest_path + '.tmp', self.manifest_path)
+
+    def transcripts(self):
+        return sorted(self.partials['transcript'].unique())
+
+    def per_speaker(self):
+        return metrics(self.partials, ['speaker'])
+
+    def per_transcript(self):
+        return metrics(self.partials, ['transcript'])
+
+    def per_day(self):
+        return metrics(self.partials, ['date'])
+
+    def compare(self, transcripts):
+        '''Returns the metrics per transcript and speaker of the given
+        transcripts.'''
+        return metrics(self.partials[self.partials['transcript'].isin(transcripts)],
+                       ['transcript', 'speaker'])
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_aggregates(results_dir):
+    '''Returns the AggregateStore of results_dir, shared by all sessions of
+    the process, after reading the parts that arrived since last time.'''
+    with _stores_lock:
+        key = os.path.abspath(results_dir)
+        if key not in _stores:
+            _stores[key] = AggregateStore(results_dir)
+        store = _stores[key]
+    store.update()
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate the results of batch.py.")
+    parser.add_argument('results_dir', nargs='?', default='results')
+    parser.add_argument('--by', choices=['speaker', 'transcript', 'day'], default='transcript')
+    args = parser.parse_args()
+
+    store = AggregateStore(args.results_dir)
+    changed = store.update()
+    print(f"{len(changed)} new or changed parts read, {len(store.manifest)} in total.")
+    table = {'speaker': store.per_speaker, 'transcript': store.per_transcript,
+             'day': store.per_day}[args.by]()
+    with pd.option_context('display.max_rows', 100, 'display.width', 200):
+        print(table)
+
+
+if __name__ == "__main__":
+    main()
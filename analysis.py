@@ -5,84 +5,472 @@ Project: Bones Ltd. job technical challenge.
 File: anaylis.py
 Description and Usage:
    The functions in this file compute the sentiments and filler word
-   ratios.
+   ratios (and emotions). Per-message results are looked up in the
+   result cache first (see cache.py) when it is enabled. With the shared
+   inference worker turned on (see inference.py), the sentiments and
+   spaCy filler ratios are computed there instead of in this process.
 """
 
-from transformers import pipeline
+import functools
+import hashlib
+import itertools
+import logging
+import multiprocessing
 import re
-import spacy
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
+import cache
+import inference
+import perf
+from models import get_model, registry
+from parsing import iter_conversation_turns
+from results import ResultTable, as_result_table
 
-def compute_filler_ratio(text, filler_words):
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r'\w+')
+
+# The fast word count follows the rules of spaCy's English tokenizer that
+# matter in transcripts (the text is lowercased first, as in 'spacy' mode):
+# URLs are one token that is not a word
+_URL_RE = re.compile(r'https?://\S+')
+# tokens joined by an apostrophe, a dot or an @ are counted together
+_JOIN_RE = re.compile(r"[.@']\w")
+# contractions written without an apostrophe are split ("dont" -> "do",
+# "nt"), as are "gonna", "gotta" and "cannot": {word: number of words}
+_SPLIT_WORDS = dict.fromkeys((
+    "aint arent cannot cant couldnt couldve darent didnt doesnt dont gonna gotta "
+    "hadnt hasnt havent hed hes howd howll howre hows howve id im isnt itd itll ive "
+    "maynt mightnt mightve mustnt mustve neednt notve oughtnt shant shes shouldnt "
+    "shouldve thatd thatll thats thered therell therere theres thereve thesed "
+    "thesell thesere theseve theyd theyll theyre theyve thisd thisll thiss thosed "
+    "thosell thosere thoseve wasnt wed werent weve whatd whatll whatre whats whatve "
+    "whend whenll whenre whens whenve whered wherell wherere wheres whereve whod "
+    "wholl whos whove whyd whyll whyre whys whyve wont wouldnt wouldve yall youd "
+    "youll youre youve").split(), 2)
+_SPLIT_WORDS.update(dict.fromkeys((
+    "cantve couldntve didntve doesntve dontve hadntve hedve hellve howdve howllve "
+    "idve illve ima itdve itllve mayntve mightntve mustntve needntve oughtntve "
+    "shantve shedve shellve shouldntve thatdve thatllve theredve therellve thesedve "
+    "thesellve theydve theyllve thisdve thisllve thosedve thosellve wedve wellve "
+    "whatdve whatllve whendve whenllve wheredve wherellve whodve whollve whydve "
+    "whyllve wontve wouldntve youdve youllve").split(), 3))
+# a unit (or am/pm after an hour) is split from its number: "3pm" -> "3", "pm"
+_NUMBER_UNIT_RE = re.compile(r'(\d+)([a-z]+)')
+_UNITS = frozenset("cm dm ft g gb ha in kb kg km kmh lb m mb mbar mg mm mph nm oz t tb yd".split())
+# the endings split from a word by an apostrophe ("it's", "we'll", "don't")
+_CLITICS = frozenset(['s', 'm', 'd', 'll', 're', 've'])
+
+
+def _word_pieces(word):
+    '''Returns the number of words spaCy counts in a token of _WORD_RE.'''
+    if word.isalpha():
+        return _SPLIT_WORDS.get(word, 1)
+    number_unit = _NUMBER_UNIT_RE.fullmatch(word)
+    if number_unit:
+        number, unit = number_unit.groups()
+        if unit in _UNITS or (unit in ('am', 'pm') and 1 <= int(number) <= 12):
+            return 1
+    return 0
+
+
+class FillerMatcher:
+    '''Counts filler phrases (single or multi-word, e.g. 'you know') in a
+    text in one pass.
+    The filler list is compiled once into a trie of words, so a text is
+    tokenized once and every position is matched against all fillers at
+    the same time. Matches follow the same rules as the regex
+    r'\bphrase\b' on the lowercased text: whole words only, and words
+    of a phrase must be separated exactly as in the phrase.
+    '''
+
+    def __init__(self, filler_words):
+        filler_words = list(filler_words)
+        self.filler_words = tuple(filler_words)
+        # identifies the filler list in cache keys
+        self.fingerprint = hashlib.sha1('\n'.join(filler_words).encode('utf-8')).hexdigest()
+
+        # every trie node is a dict: (separator, word) -> child node, plus
+        # the key None -> [phrase id, multiplicity] for complete phrases
+        self._trie = {}
+        self._n_phrases = 0
+        for phrase in filler_words:
+            phrase = phrase.lower()
+            tokens = list(_WORD_RE.finditer(phrase))
+            if not tokens:
+                continue
+            node = self._trie
+            prev_end = None
+            for token in tokens:
+                sep = None if prev_end is None else phrase[prev_end:token.start()]
+                node = node.setdefault((sep, token.group()), {})
+                prev_end = token.end()
+            if None in node:
+                # the same filler listed twice is counted twice (as before)
+                node[None][1] += 1
+            else:
+                node[None] = [self._n_phrases, 1]
+                self._n_phrases += 1
+
+    def count(self, text):
+        '''Returns (filler_count, word_count) of text.
+        The word count approximates the number of spaCy is_alpha tokens
+        (the 'spacy' filler mode) without spaCy: a contraction like
+        "don't" counts as one word, "dont", "gonna" and "cannot" as two,
+        "3pm" as one and URLs, e-mail addresses, @handles and "e.g." as
+        none.
+        Known differences: clipped words starting or ending with an
+        apostrophe ("'cause", "lovin'") count as one word (none in spaCy)
+        and spaCy's other tokenizer exceptions are not applied.'''
+        text = text.lower()
+        tokens = [(m.group(), m.start(), m.end()) for m in _WORD_RE.finditer(text)]
+
+        filler_count = 0
+        # fillers don't overlap with an earlier match of the same filler
+        next_allowed = [0] * self._n_phrases
+        for i, (word, _, _) in enumerate(tokens):
+            node = self._trie.get((None, word))
+            j = i
+            while node is not None:
+                if None in node:
+                    phrase_id, multiplicity = node[None]
+                    if i >= next_allowed[phrase_id]:
+                        filler_count += multiplicity
+                        next_allowed[phrase_id] = j + 1
+                j += 1
+                if j >= len(tokens):
+                    break
+                sep = text[tokens[j - 1][2]:tokens[j][1]]
+                node = node.get((sep, tokens[j][0]))
+
+        return filler_count, self._count_words(text, tokens)
+
+    @staticmethod
+    def _count_words(text, tokens):
+        '''Returns the word count of count() from the _WORD_RE tokens of text.'''
+        if '://' not in text and not _JOIN_RE.search(text):
+            # the common case: every token counts on its own
+            words = [word for word, _, _ in tokens]
+            return (sum(map(_SPLIT_WORDS.get, filter(str.isalpha, words), itertools.repeat(1)))
+                    + sum(_word_pieces(word) for word in itertools.filterfalse(str.isalpha, words)))
+        if '://' in text:
+            urls = [m.span() for m in _URL_RE.finditer(text)]
+            tokens = [token for token in tokens
+                      if not any(start <= token[1] < end for start, end in urls)]
+        word_count = 0
+        n = len(tokens)
+        i = 0
+        while i < n:
+            word, start, end = tokens[i]
+            group_start = start
+            # tokens joined by an apostrophe ("don't", "o'clock"), a dot
+            # ("e.g", "example.com") or an @ (e-mail addresses)
+            group = [word]
+            joins = ''
+            while i + 1 < n and tokens[i + 1][1] == end + 1 and text[end] in "'.@":
+                joins += text[end]
+                i += 1
+                word, start, end = tokens[i]
+                group.append(word)
+            i += 1
+            if group_start and text[group_start - 1] == '@':
+                # an @handle, not a word
+                continue
+            if len(group) == 1:
+                word_count += _word_pieces(word)
+            elif joins.strip("'") == '' and group[0].isalpha() and all(
+                    piece in _CLITICS or (piece == 't' and prev.endswith('n'))
+                    or (prev, piece) == ('y', 'all')
+                    for prev, piece in zip(group, group[1:])):
+                # the word before the contraction endings
+                word_count += 1
+            # anything else ("o'clock", "e.g", "a@b.com") is one token
+            # that is not a word
+        return word_count
+
+
+@functools.lru_cache(maxsize=8)
+def _compile_fillers(filler_words):
+    return FillerMatcher(filler_words)
+
+
+def compile_fillers(filler_words):
+    '''Returns the FillerMatcher of filler_words (compiled once per list).'''
+    if isinstance(filler_words, FillerMatcher):
+        return filler_words
+    return _compile_fillers(tuple(filler_words))
+
+
+def compute_filler_ratio(text, filler_words, mode='spacy'):
    '''Find the filler_words in a text and returns the ratio of filler_words/all_words
     text: the intial text to look at. 
-    filler_words: All filler words we consider for this function.
+    filler_words: All filler words we consider for this function
+      (a list, or a FillerMatcher already compiled from it).
+    mode: 'spacy' counts all words with spaCy, 'fast' counts them in the
+      same pass as the fillers (no spaCy needed).
     '''
    text = text.strip()
+   matcher = compile_fillers(filler_words)
+
+   # Count filler words (both single and multi-word) in one pass
+   filler_count, total_words = matcher.count(text)
 
-   '''
-   # only one of these two should be used. The first one in 1)
-   # cannot capture fillers like 'I swear' or 'You know', but
-   # spacy is powerful enough to help capture them in text.
-   # BTW, Spacy is slower! Uncomment if needed for faster one in 1). 
-
-   # 1)
-   all_words = text.lower().split(' ')
-
-   filler_count = 0
-   for word in all_words:
-      if(word in filler_words or word in filler_words_with_comma):
-         filler_count+=1
-   filler_words_ratio = filler_count/len(all_words)
-   return filler_words_ratio 
-   '''
-
-   # 2) using spacy tool
-   # Load spaCy model
-   nlp = spacy.load("en_core_web_sm")
-   doc = nlp(text.lower())
-
-   # Count total words (excluding punctuation, digits)
-   total_words = len([token for token in doc if token.is_alpha])
-
-   # Count filler words (both single and multi-word) --> real power of spacy
-   filler_count = 0
-   for phrase in filler_words:
-      pattern = r'\b' + re.escape(phrase.lower()) + r'\b'
-      matches = re.findall(pattern, text.lower())
-      filler_count += len(matches)
+   if mode == 'spacy':
+      # spaCy model (loaded once per process, see models.py)
+      nlp = get_model("spacy")
+      doc = nlp(text.lower())
+
+      # Count total words (excluding punctuation, digits)
+      total_words = len([token for token in doc if token.is_alpha])
+   elif mode != 'fast':
+      raise ValueError(f"Unknown filler mode '{mode}', expected 'spacy' or 'fast'.")
 
    # Calculate ratio
    filler_words_ratio = filler_count / total_words if total_words > 0 else 0
    return filler_words_ratio
 
 
-def compute_sentiment(conversation, filler_words):
+def _cached(fingerprint, messages, compute):
+    '''Returns compute(messages), but only calls compute for the messages
+    whose results (for this fingerprint) are not in the result cache.'''
+    result_cache = cache.get_cache()
+    if result_cache is None:
+        return compute(messages)
+    keys = [cache.cache_key(*fingerprint, msg) for msg in messages]
+    return result_cache.cached(keys, lambda missing: compute([messages[i] for i in missing]))
+
+
+def batched_sentiment(sentiment_pipeline, messages, batch_size=32):
+    '''Runs the sentiment pipeline over messages in batches and returns
+    the predictions in the original order.
+    Messages are sorted by token length first so that each batch holds
+    messages of similar length, which keeps the padding small.
+    '''
+    tokenizer = getattr(sentiment_pipeline, 'tokenizer', None)
+    if tokenizer is not None and messages:
+        lengths = [len(ids) for ids in tokenizer(messages)['input_ids']]
+    else:
+        lengths = [len(msg.split()) for msg in messages]
+    order = sorted(range(len(messages)), key=lengths.__getitem__)
+
+    predictions = [None] * len(messages)
+    for start in range(0, len(order), batch_size):
+        batch = order[start:start + batch_size]
+        outputs = sentiment_pipeline([messages[i] for i in batch],
+                                     batch_size=len(batch), truncation=True)
+        for i, output in zip(batch, outputs):
+            predictions[i] = output
+    return predictions
+
+
+def sentiment_fingerprint(spec=None):
+    '''Identifies the sentiment model (and backend) of spec (the one in
+    use by default), i.e. what a sentiment result depends on besides the
+    message.'''
+    model_name, model_version, model_config = spec or registry.spec("sentiment")
+    fingerprint = ("sentiment", model_name, model_version)
+    backend = model_config.get('backend', 'pytorch')
+    if backend != 'pytorch':
+        # other backends give slightly different scores; the default one
+        # keeps its old keys so existing caches stay valid
+        fingerprint += (backend,)
+    return fingerprint
+
+
+def filler_fingerprint(filler_words, filler_mode, spacy_spec=None):
+    '''Identifies what a filler ratio depends on besides the message: the
+    filler list, the mode and the spaCy model counting the words (the one
+    of spacy_spec, or in use).'''
+    words_model = (spacy_spec or registry.spec("spacy"))[0] if filler_mode == 'spacy' else None
+    return ("filler", filler_mode, words_model, compile_fillers(filler_words).fingerprint)
+
+
+def compute_sentiments(messages, batch_size=32):
+    '''Returns the sentiment ({'label', 'score'}) of every message. The
+    model is only run (here, or in the inference worker when it is
+    turned on) for the messages that are not cached yet.'''
+    client = inference.get_client()
+    # the worker is asked for this very model, whose fingerprint the
+    # results are cached under
+    spec = registry.spec("sentiment")
+
+    def run_sentiment(msgs):
+        if client is not None:
+            return client.sentiment(msgs, spec)
+        # Hugging Face sentiment analysis pipeline (shared by all sessions,
+        # which take turns using it, see models.py)
+        with registry.using("sentiment") as sentiment_pipeline:
+            return batched_sentiment(sentiment_pipeline, msgs, batch_size=batch_size)
+
+    backend = spec[2].get('backend', 'pytorch')
+    with perf.stage("sentiment", messages=len(messages), backend=backend):
+        sentiments = _cached(sentiment_fingerprint(spec), messages, run_sentiment)
+    perf.count("messages", len(messages))
+    return sentiments
+
+
+def compute_filler_ratios(messages, filler_words, filler_mode='spacy'):
+    '''Returns compute_filler_ratio() of every message, computing only
+    the ones that are not cached yet.'''
+    client = inference.get_client()
+    matcher = compile_fillers(filler_words)
+    spacy_spec = registry.spec("spacy")
+
+    def run_filler(msgs):
+        if client is not None and filler_mode == 'spacy':
+            return client.filler_ratios(msgs, matcher.filler_words, filler_mode, spacy_spec)
+        return [compute_filler_ratio(text=msg, filler_words=matcher, mode=filler_mode)
+                for msg in msgs]
+
+    with perf.stage("filler_ratio", messages=len(messages), mode=filler_mode):
+        return _cached(filler_fingerprint(matcher, filler_mode, spacy_spec), messages, run_filler)
+
+
+def _analyze_chunk(speakers, messages, matcher, batch_size, filler_mode):
+    '''Returns the ResultTable of one chunk of messages.'''
+    # compute the sentiments for all messages of the chunk at once;
+    # the model is only loaded if some message is not cached yet
+    sentiments = compute_sentiments(messages, batch_size=batch_size)
+    filler_ratios = compute_filler_ratios(messages, matcher, filler_mode)
+    return ResultTable.from_columns(speakers, messages,
+                                    [sentiment['label'] for sentiment in sentiments],
+                                    [sentiment['score'] for sentiment in sentiments],
+                                    filler_ratios)
+
+
+def iter_sentiment_chunks(turns, filler_words, batch_size=32, filler_mode='spacy',
+                          chunk_size=1024, line_numbers=False):
+    '''Analyzes turns (an iterable of parsing.Turn, e.g. from
+    parsing.iter_file_turns) and yields the results (a ResultTable) of
+    chunk_size messages at a time, so a transcript of any length is analyzed in
+    constant memory. With line_numbers, (line numbers, results) pairs are
+    yielded instead, with the transcript line of every message (Turn.line_no).'''
+    matcher = compile_fillers(filler_words)
+    turns = iter(turns)
+    n_messages = 0
+    start = time.perf_counter()
+    while True:
+        chunk = list(itertools.islice(turns, chunk_size))
+        if not chunk:
+            break
+        n_messages += len(chunk)
+        results = _analyze_chunk([turn.speaker for turn in chunk],
+                                 [turn.message for turn in chunk],
+                                 matcher, batch_size, filler_mode)
+        yield ([turn.line_no for turn in chunk], results) if line_numbers else results
+
+    elapsed = time.perf_counter() - start
+    # with perf turned off too
+    logger.debug("analyzed %d messages in %.3f s", n_messages, elapsed)
+    if n_messages:
+        perf.event("throughput", stage="sentiment", messages=n_messages,
+                   seconds=round(elapsed, 6), msgs_per_s=round(n_messages / max(elapsed, 1e-9), 1))
+    if cache.get_cache() is not None:
+        perf.event("cache", **cache.get_cache().stats())
+
+
+def compute_sentiment(conversation, filler_words, batch_size=32, filler_mode='spacy'):
     '''Does sentiment analysis using hugginface and also it's computing
-    the ration of filler words to all words in a text given.'''
-    
-    # Load Hugging Face sentiment analysis pipeline
-    sentiment_pipeline = pipeline("sentiment-analysis")
-
-    conversation_lines = conversation.splitlines()
-    
-    # compute the sentiments for all lines in the conversation  
-    results = []
-    for line in conversation_lines:
-        # l = f.read()
-        print(line)
-        speaker, msg = line.split(':', 1)
-        filler_words_ratio = compute_filler_ratio(text=msg,
-                                                  filler_words=filler_words)
-
-        sentiment = sentiment_pipeline(msg)[0]
-        results.append({
-            "speaker": speaker,
-            "message": msg,
-            "sentiment": sentiment['label'],
-            "score": sentiment['score'],
-            "filler_words_ratio": filler_words_ratio,
-
-        })
-        
-    return results
+    the ration of filler words to all words in a text given.
+    conversation is the transcript text, or an iterable of parsing.Turn.
+    The sentiment model is run in batches of batch_size messages and
+    filler_mode is passed to compute_filler_ratio.
+    Returns the results as a ResultTable (see results.py).'''
+    if isinstance(conversation, str):
+        conversation = iter_conversation_turns(conversation)
+
+    return ResultTable.concat(iter_sentiment_chunks(conversation, filler_words,
+                                                    batch_size=batch_size,
+                                                    filler_mode=filler_mode))
+
+
+EMOTION_COLS = ['Happy', 'Angry', 'Surprise', 'Sad', 'Fear']
+
+
+def _emotions_chunk(messages):
+    # runs in a worker process
+    import text2emotion as te
+    return [te.get_emotion(msg) for msg in messages]
+
+
+def emotion_fingerprint():
+    '''Identifies the emotion model (the text2emotion version).'''
+    from importlib.metadata import version
+    return ("emotion", "text2emotion", version("text2emotion"))
+
+
+_pool = None
+_pool_workers = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers):
+    '''Returns the process pool the emotions are computed on. It is
+    started on first use and kept for the next calls (a new one is started
+    if workers changes). Its processes are spawned rather than forked, as
+    forking the multi-threaded Streamlit server can leave a child stuck on
+    a lock held by another thread.'''
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers,
+                                        mp_context=multiprocessing.get_context('spawn'))
+            _pool_workers = workers
+        return _pool
+
+
+def _drop_pool(pool):
+    # after a worker process died, so that the next call starts a new pool
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def compute_emotions(messages, workers=None, progress=None, chunk_size=50):
+    '''Returns the text2emotion scores (a dict of 'Happy', 'Angry',
+    'Surprise', 'Sad' and 'Fear') of every message.
+    Messages that are not cached yet are split in chunks and computed in
+    parallel on a pool of `workers` processes (None: one per CPU, 1: no
+    pool), kept between calls (see _get_pool).
+    progress(done, total) is called after every chunk.'''
+    def run_emotions(msgs):
+        chunks = [msgs[i:i + chunk_size] for i in range(0, len(msgs), chunk_size)]
+        emotions = []
+        if workers == 1 or len(chunks) < 2:
+            for chunk in chunks:
+                emotions.extend(_emotions_chunk(chunk))
+                if progress:
+                    progress(len(emotions), len(msgs))
+            return emotions
+        pool = _get_pool(workers)
+        try:
+            # map keeps the chunks in order
+            for chunk_emotions in pool.map(_emotions_chunk, chunks):
+                emotions.extend(chunk_emotions)
+                if progress:
+                    progress(len(emotions), len(msgs))
+        except BrokenProcessPool:
+            _drop_pool(pool)
+            raise
+        return emotions
+
+    messages = list(messages)
+    with perf.stage("emotions", messages=len(messages)):
+        return _cached(emotion_fingerprint(), messages, run_emotions)
+
+
+def add_emotions(results, workers=None, progress=None):
+    '''Returns a copy of results (a ResultTable, or a list of result dicts)
+    with the emotion scores (the EMOTION_COLS columns) of every message,
+    next to its sentiment.'''
+    results = as_result_table(results)
+    emotions = compute_emotions(results.messages(), workers=workers, progress=progress)
+    return results.with_columns({col: [emotion.get(col, 0.0) for emotion in emotions]
+                                 for col in EMOTION_COLS})
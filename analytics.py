@@ -0,0 +1,303 @@
+"""
+Author: Sobhan
+Date: 17-10-2026
+Project: Bones Ltd. job technical challenge.
+File: analytics.py
+Description and Usage:
+   Builds the analytics frame behind render_and_visualize() once per
+   result set: the DataFrame with all derived columns (computed
+   vectorized) and the per-speaker and per-turn aggregates the charts
+   need. Frames are cached by a hash of the results, so switching between
+   the dashboard options (or rerunning Streamlit) is just a lookup. A frame
+   can be extended with the messages appended to a transcript, updating
+   the aggregates without recomputing the earlier messages.
+   For long conversations the frame also gives reduced versions of the
+   series the charts draw (LTTB decimation of the sentiment progression,
+   binned scores, turns grouped in buckets), so drawing a chart takes
+   about the same time whatever the number of messages.
+
+   Usage:
+      from analytics import get_analytics
+      frame = get_analytics(results)
+      frame.per_speaker, frame.turn_sentiment, ...
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from analysis import EMOTION_COLS
+from results import ResultTable, as_result_table
+
+# columns shown in the "Show Data Table" option
+TABLE_COLUMNS = ['speaker', 'message', 'sentiment', 'score',
+                 'filler_words_ratio', 'sentiment_score']
+# columns added to the results by _derive()
+DERIVED_COLS = ['sentiment_score', 'message_index', 'message_length', 'turn']
+
+
+def results_hash(results):
+    '''Returns a hash identifying the content of results (a ResultTable or
+    a list of result dicts).'''
+    if isinstance(results, ResultTable):
+        return results.content_hash()
+    digest = hashlib.sha1()
+    for entry in results:
+        # all keys, so that e.g. added emotion scores change the hash
+        digest.update(repr(sorted(entry.items())).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def lttb(x, y, n_out):
+    '''Returns the indexes of the n_out points of the series (x, y) kept by
+    Largest-Triangle-Three-Buckets decimation: the first and last points,
+    and in every bucket between them the point making the largest triangle
+    with the previous kept point and the mean of the next bucket. Peaks and
+    dips survive, unlike with plain striding.'''
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    # n_out - 2 buckets between the first and the last point
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    keep = np.empty(n_out, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x, next_y = x[hi:edges[i + 2]].mean(), y[hi:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        area = np.abs((x[a] - next_x) * (y[lo:hi] - y[a])
+                      - (x[a] - x[lo:hi]) * (next_y - y[a]))
+        a = lo + int(area.argmax())
+        keep[i + 1] = a
+    return keep
+
+
+def _derive(df, first_index=0, last_speaker=None, last_turn=0):
+    '''Adds the derived columns to a frame of results, all vectorized.
+    The frame may follow earlier messages: first_index is the index of its
+    first message, and last_speaker and last_turn are those of the message
+    before it.'''
+    df['sentiment_score'] = np.where(df['sentiment'] == 'POSITIVE',
+                                     df['score'], -df['score']).astype(float)
+    df['message_index'] = np.arange(first_index, first_index + len(df))
+    df['message_length'] = df['message'].str.split().str.len().fillna(0).astype(int)
+    # a turn is a group of consecutive messages from the same speaker
+    starts = (df['speaker'] != df['speaker'].shift()).to_numpy(dtype=bool, copy=True)
+    if len(df) and last_speaker is not None:
+        starts[0] = df['speaker'].iloc[0] != last_speaker
+    df['turn'] = starts.cumsum() + last_turn
+    return df
+
+
+def _speaker_sums(df, has_emotions):
+    '''Returns the per-speaker sums the per-speaker aggregates are made
+    of; unlike means, they can be added up chunk by chunk.'''
+    sums = df.groupby('speaker', observed=True).agg(
+        sentiment_score=('sentiment_score', 'sum'),
+        filler_words_ratio=('filler_words_ratio', 'sum'),
+        messages=('message', 'size'),
+        **{col: (col, 'sum') for col in (EMOTION_COLS if has_emotions else [])})
+    sums.index = sums.index.astype(str)
+    return sums
+
+
+def _sentiment_counts(df):
+    counts = df.groupby(['speaker', 'sentiment'], observed=True).size().unstack(fill_value=0)
+    counts.index = counts.index.astype(str)
+    counts.columns = counts.columns.astype(str)
+    return counts
+
+
+def _turn_tables(df):
+    '''Returns the per-turn aggregates (turn_counts, turn_sentiment).'''
+    turn_counts = df.groupby(['turn', 'speaker'], observed=True).size().reset_index(name='count')
+    turn_sentiment = df.groupby('turn', observed=True).agg(
+        {'speaker': 'first', 'sentiment_score': 'mean'}).reset_index()
+    for table in (turn_counts, turn_sentiment):
+        table['speaker'] = table['speaker'].astype(str)
+    return turn_counts, turn_sentiment
+
+
+class AnalyticsFrame:
+    '''The per-message frame of a result set and its aggregates.
+    key identifies the result set (its hash by default).'''
+
+    def __init__(self, results, key=None):
+        self.key = key or results_hash(results)
+        # speaker and sentiment come as Categorical columns, the scores
+        # without a copy (see results.py); groupbys on them pass
+        # observed=True, so unused categories (e.g. the other speakers of
+        # a turn) don't become empty groups
+        df = _derive(as_result_table(results).to_pandas())
+        has_emotions = all(col in df.columns for col in EMOTION_COLS)
+        # in order of first appearance
+        speakers = [str(speaker) for speaker in df['speaker'].unique()]
+        self._set(df, speakers, _speaker_sums(df, has_emotions), _sentiment_counts(df),
+                  *_turn_tables(df))
+
+    def _set(self, df, speakers, speaker_sums, sentiment_counts, turn_counts, turn_sentiment):
+        self.df = df
+        self.speakers = speakers
+        self.has_emotions = all(col in df.columns for col in EMOTION_COLS)
+        self._speaker_sums = speaker_sums.reindex(speakers)
+        messages = self._speaker_sums['messages']
+
+        # per-speaker aggregates
+        self.per_speaker = pd.DataFrame({
+            'speaker': speakers,
+            'sentiment_score': self._speaker_sums['sentiment_score'].to_numpy(),
+            'filler_words_ratio': (self._speaker_sums['filler_words_ratio'] / messages).to_numpy(),
+            'messages': messages.to_numpy(dtype=int),
+        })
+        self.sentiment_counts = sentiment_counts
+
+        # per-turn aggregates
+        self.turn_counts = turn_counts
+        self.turn_sentiment = turn_sentiment
+
+        # per-speaker emotions, once they were added to the results
+        self.emotion_summary = (
+            self._speaker_sums[EMOTION_COLS].div(messages, axis=0)
+            .rename_axis('speaker').reset_index()
+            if self.has_emotions else None)
+
+    def extend(self, results, key=None):
+        '''Returns the frame of the messages of this one followed by
+        results (with the same columns). Only the new messages are derived
+        and aggregated: the per-speaker aggregates are updated from their
+        sums and the per-turn ones from the last turn on, so following a
+        growing transcript doesn't recompute its history. key defaults to
+        a hash of this key and of results.'''
+        key = key or hashlib.sha1((self.key + results_hash(results)).encode()).hexdigest()
+        new = as_result_table(results).to_pandas()
+        if not len(self.df):
+            return AnalyticsFrame(results, key=key)
+        if not len(new):
+            return self
+        old = self.df.copy(deep=False)
+        if list(new.columns) != [col for col in old.columns if col not in DERIVED_COLS]:
+            raise ValueError("Results to extend an analytics frame with must "
+                             "have the columns of the frame's results.")
+
+        # the same categories on both sides, so that concat keeps them
+        for col in ('speaker', 'sentiment'):
+            categories = old[col].cat.categories.union(new[col].cat.categories, sort=False)
+            old[col] = old[col].cat.set_categories(categories)
+            new[col] = new[col].cat.set_categories(categories)
+        last_turn = int(old['turn'].iloc[-1])
+        new = _derive(new, first_index=len(old), last_speaker=old['speaker'].iloc[-1],
+                      last_turn=last_turn)
+        df = pd.concat([old, new], ignore_index=True)
+
+        speakers = self.speakers + [speaker for speaker in map(str, new['speaker'].unique())
+                                    if speaker not in self.speakers]
+        speaker_sums = self._speaker_sums.add(_speaker_sums(new, self.has_emotions), fill_value=0)
+        sentiment_counts = self.sentiment_counts.add(
+            _sentiment_counts(new), fill_value=0).fillna(0).astype(int)
+
+        # the last turn may go on in the new messages: redo it
+        tail = df.iloc[int(np.searchsorted(df['turn'].to_numpy(), last_turn)):]
+        tables = []
+        for table, tail_table in zip((self.turn_counts, self.turn_sentiment), _turn_tables(tail)):
+            head = table.iloc[:int(np.searchsorted(table['turn'].to_numpy(), last_turn))]
+            tables.append(pd.concat([head, tail_table], ignore_index=True))
+        frame = AnalyticsFrame.__new__(AnalyticsFrame)
+        frame.key = key
+        frame._set(df, speakers, speaker_sums, sentiment_counts, *tables)
+        return frame
+
+    @property
+    def table(self):
+        return self.df[TABLE_COLUMNS + (EMOTION_COLS if self.has_emotions else [])]
+
+    def progression(self, max_points):
+        '''Returns the (message_index, sentiment_score, speaker) series,
+        decimated with lttb() to about max_points points in total (shared
+        between the speakers by their number of messages).'''
+        df = self.df[['message_index', 'sentiment_score', 'speaker']]
+        if len(df) <= max_points:
+            return df
+        parts = []
+        for _, group in df.groupby('speaker', sort=False, observed=True):
+            n_out = max(3, max_points * len(group) // len(df))
+            keep = lttb(group['message_index'], group['sentiment_score'], n_out)
+            parts.append(group.iloc[keep])
+        return pd.concat(parts)
+
+    def score_histogram(self, bins):
+        '''Returns the sentiment scores binned per speaker, as a frame of
+        (speaker, sentiment_score: bin center, count), and the bin edges.'''
+        edges = np.histogram_bin_edges(self.df['sentiment_score'], bins=bins)
+        centers = (edges[:-1] + edges[1:]) / 2
+        parts = []
+        for speaker, group in self.df.groupby('speaker', sort=False, observed=True):
+            counts, _ = np.histogram(group['sentiment_score'], bins=edges)
+            parts.append(pd.DataFrame({'speaker': speaker, 'sentiment_score': centers,
+                                       'count': counts}))
+        return pd.concat(parts, ignore_index=True), edges
+
+    def turn_buckets(self, table, value, max_bars):
+        '''Groups the per-turn table (turn_counts or turn_sentiment) in
+        buckets of consecutive turns so that at most about max_bars bars
+        are drawn; value is the mean of each speaker in a bucket, which is
+        labelled by its first turn. Returns the table and the bucket size.'''
+        n_turns = int(self.df['turn'].max()) if len(self.df) else 0
+        size = -(-n_turns // max_bars) if n_turns > max_bars else 1
+        if size == 1:
+            return table, size
+        bucket = (table['turn'] - 1) // size * size + 1
+        grouped = table.groupby([bucket, 'speaker'], observed=True)[value].mean().reset_index()
+        return grouped, size
+
+
+_frames = OrderedDict()
+# the last result lists seen, so an unchanged list is not even rehashed
+_by_identity = OrderedDict()
+_lock = threading.Lock()
+_MAX_FRAMES = 8
+
+
+def get_analytics(results):
+    '''Returns the AnalyticsFrame of results, building it only once per
+    distinct result set (the last few are kept).
+    A result list must not be changed in place once passed here.'''
+    with _lock:
+        if id(results) in _by_identity and _by_identity[id(results)][0] is results:
+            key = _by_identity[id(results)][1]
+        else:
+            key = results_hash(results)
+            # keep a reference to results so that its id is not reused
+            _by_identity[id(results)] = (results, key)
+            while len(_by_identity) > _MAX_FRAMES:
+                _by_identity.popitem(last=False)
+
+        if key in _frames:
+            _frames.move_to_end(key)
+            return _frames[key]
+
+    frame = AnalyticsFrame(results, key=key)
+    with _lock:
+        _frames[key] = frame
+        while len(_frames) > _MAX_FRAMES:
+            _frames.popitem(last=False)
+    return frame
+
+
+def put_analytics(results, frame):
+    '''Makes get_analytics(results) return frame (e.g. one extended from
+    the frame of earlier results) without hashing results.'''
+    with _lock:
+        _by_identity[id(results)] = (results, frame.key)
+        while len(_by_identity) > _MAX_FRAMES:
+            _by_identity.popitem(last=False)
+        _frames[frame.key] = frame
+        while len(_frames) > _MAX_FRAMES:
+            _frames.popitem(last=False)
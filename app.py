@@ -10,66 +10,174 @@ Description and Usage:
 """
 
 import configparser
+import os
 import streamlit as st
 
-from utils import read_fillers_from_file, load_conversation, render_and_visualize
-from analysis import compute_sentiment
+from utils import (read_fillers_from_file, load_conversation,
+                   render_and_visualize, render_comparison, get_follower)
+from pipeline import IncrementalAnalysis
+import models
+import cache
+import inference
+import perf
 
 
 def main(
     transcript_file: str = 'transcript.txt',
     filler_words_file: str = 'filler_words.txt',
     transcript_auto_fill: bool = False,
+    sentiment_batch_size: int = 32,
+    filler_mode: str = 'spacy',
+    transcript_follow: bool = False,
+    follow_interval: float = 5.0,
+    emotion_workers: int = 0,
+    chart_max_points: int = 2000,
+    chart_max_bars: int = 100,
+    results_dir: str = 'results',
 ) -> None:
     """
     Main entry function to load conversation data, compute sentiment,
     and render the Streamlit interface.
     Uses st.session_state to avoid redundant reloads and computations.
+    With transcript_follow, the transcript is treated as a live file and
+    only the lines appended to it are analyzed every follow_interval seconds.
+    emotion_workers is the number of processes computing emotions
+    (0: one per CPU). Charts of longer series than chart_max_points
+    (or more turns than chart_max_bars) are drawn from a reduced series.
+    If results_dir holds results of batch.py, the sidebar also offers to
+    compare those transcripts.
     """
+    emotion_workers = emotion_workers or None
+    chart_limits = dict(chart_max_points=chart_max_points, chart_max_bars=chart_max_bars)
+
+    if os.path.isdir(results_dir) and st.sidebar.radio(
+            "View", ["Conversation", "Compare transcripts"]) == "Compare transcripts":
+        render_comparison(results_dir)
+        return
+
+    if transcript_follow:
+        follow(transcript_file, filler_words_file, follow_interval, emotion_workers,
+               chart_limits, batch_size=sentiment_batch_size, filler_mode=filler_mode)
+        return
 
     # the 'if' condition avoids loading conversations more than once.
     # So, the strategy is to load and compute sentiments once
     # but show and play with checkbox without reloading 
     # and computing everything. By default, streamlit reloads
     # everything on the file, but this session_state will put a stop
-    # to it.
-    if "results" not in st.session_state:
-        # loading all fillers
-        all_filler_words = read_fillers_from_file(filler_words_file)
-
+    # to it. "Re-analyze" reads the inputs again and recomputes only
+    # the parts of the analysis whose inputs changed.
+    if "pipeline" not in st.session_state:
         # loading conversation 
         conversation = load_conversation(
             auto_fill=transcript_auto_fill,
             file_path=transcript_file,
         )
+        st.session_state.pipeline = IncrementalAnalysis()
+    elif st.sidebar.button("Re-analyze", help="Reads the transcript, the filler words and "
+                           "the models in config.ini again and recomputes only what changed."):
+        conversation = load_conversation(file_path=transcript_file)
+    else:
+        conversation = None
 
-        # compute sentiments
-        results = compute_sentiment(conversation, all_filler_words)
+    if conversation is not None:
+        # compute sentiments (only the parts whose inputs changed, see pipeline.py)
+        pipeline = st.session_state.pipeline
+        pipeline.update(conversation, read_fillers_from_file(filler_words_file),
+                        batch_size=sentiment_batch_size, filler_mode=filler_mode,
+                        emotion_workers=emotion_workers)
+        st.session_state.results = pipeline.results
+        st.session_state.recomputed = pipeline.recomputed
+    if st.session_state.get('recomputed') is not None:
+        st.sidebar.caption(f"Last analysis computed: {', '.join(st.session_state.recomputed) or 'nothing (no input changed)'}")
 
-        # st.session_state.computed_already = True
-        st.session_state.results = results
+    # display with conversation streamlit and plot graphs
+    render_and_visualize(inputs=st.session_state.results, emotion_workers=emotion_workers,
+                         **chart_limits)
 
-        # display with conversation streamlit and plot graphs
-        render_and_visualize(inputs=results)
 
-    else:
-        results = st.session_state.results
-        render_and_visualize(inputs=results)
+def follow(transcript_file, filler_words_file, interval, emotion_workers=None,
+           chart_limits=None, **kwargs):
+    """
+    Follows a growing transcript: reruns every interval seconds, analyzes
+    only the newly appended lines and redraws with all results so far.
+    """
 
+    @st.fragment(run_every=interval)
+    def live_view():
+        follower = get_follower(transcript_file)
+        n_new = follower.update(read_fillers_from_file(filler_words_file), **kwargs)
+        if n_new:
+            perf.event("follow", file=transcript_file, messages=n_new)
+        st.session_state.results = follower.results
+        # render_and_visualize() adds the emotions through it
+        st.session_state.follower = follower
+        if follower.results:
+            render_and_visualize(inputs=follower.results, emotion_workers=emotion_workers,
+                                 **(chart_limits or {}))
+        else:
+            st.info(f"Waiting for lines in '{transcript_file}'...")
 
-if __name__ == "__main__":
-    
+    live_view()
+
+
+def setup(config_file='config.ini'):
+    '''Reads config_file, configures the process-wide parts (perf, models,
+    inference worker, cache) and returns the keyword arguments of main().
+    This is all that runs before the first render, so it must stay cheap:
+    the models listed in warm_up are loaded in a background thread.'''
     # Load config file content
     config = configparser.ConfigParser()
-    config.read('config.ini')
+    config.read(config_file)
 
     # Access variables
     transcript_file = config['DEFAULT'].get('transcript_file', 'transcript.txt')
     filler_words_file = config['DEFAULT'].get('filler_words_file', 'filler_words.txt')
     transcript_auto_fill = config['DEFAULT'].getboolean('transcript_auto_fill', False)
+    sentiment_batch_size = config['DEFAULT'].getint('sentiment_batch_size', 32)
+    filler_mode = config['DEFAULT'].get('filler_mode', 'spacy')
+    transcript_follow = config['DEFAULT'].getboolean('transcript_follow', False)
+    follow_interval = config['DEFAULT'].getfloat('follow_interval', 5.0)
+    emotion_workers = config['DEFAULT'].getint('emotion_workers', 0)
+    chart_max_points = config['DEFAULT'].getint('chart_max_points', 2000)
+    chart_max_bars = config['DEFAULT'].getint('chart_max_bars', 100)
+    results_dir = config['DEFAULT'].get('results_dir', 'results')
+
+    # stage timings / profiles (perf_enabled), see perf.py
+    perf.configure(config['DEFAULT'])
+
+    # models are shared by all sessions of this process; re-registering
+    # them on every rerun reloads only those whose config has changed.
+    models_config = config['MODELS'] if config.has_section('MODELS') else {}
+    models.configure(models_config)
+    warm_up_keys = [k.strip() for k in models_config.get('warm_up', '').split(',') if k.strip()]
+
+    # optional shared worker owning the sentiment and spaCy models of all
+    # sessions (inference_worker), see inference.py; connected (or
+    # started) in the background like the warm-up below
+    inference.configure(config['DEFAULT'], models_config)
+    if inference.enabled():
+        warm_up_keys = [k for k in warm_up_keys if k not in ('sentiment', 'spacy')]
+    # once per process, without holding up the first render
+    models.warm_up(warm_up_keys, background=True)
 
-    main(
+    # persistent per-message result cache (empty cache_file turns it off)
+    cache.configure(config['DEFAULT'])
+
+    return dict(
         transcript_file=transcript_file,
         filler_words_file=filler_words_file,
         transcript_auto_fill=transcript_auto_fill,
+        sentiment_batch_size=sentiment_batch_size,
+        filler_mode=filler_mode,
+        transcript_follow=transcript_follow,
+        follow_interval=follow_interval,
+        emotion_workers=emotion_workers,
+        chart_max_points=chart_max_points,
+        chart_max_bars=chart_max_bars,
+        results_dir=results_dir,
     )
+
+
+if __name__ == "__main__":
+    main(**setup())
@@ -0,0 +1,185 @@
+"""
+Author: Sobhan
+Date: 17-10-2026
+Project: Bones Ltd. job technical challenge.
+File: batch.py
+Description and Usage:
+   Headless analysis of a whole directory of transcripts (no Streamlit).
+   Transcripts are spread over a pool of worker processes; each worker
+   loads the models once (see models.py) and keeps them warm for all the
+   transcripts it gets.
+   Results are written as a Parquet dataset: one part file per transcript
+   in the output directory, which pandas/pyarrow read as one table:
+      pd.read_parquet('results/')
+   A part file is only written once its transcript is fully analyzed, so
+   re-running the same command after a crash skips the finished ones.
+   The date of a part (its date column, and run_date in its metadata) is
+   the day the batch run started: transcripts have no timestamps of their
+   own, and the modification time of a transcript file changes when it is
+   copied or touched.
+
+   Suggested run command:
+      > python batch.py transcripts/ -o results/ --workers 4
+"""
+
+import argparse
+import configparser
+import datetime
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cache
+import models
+from analysis import iter_sentiment_chunks
+from parsing import iter_file_turns
+from utils import read_fillers_from_file
+
+# columns of the part files
+COLUMNS = ['transcript', 'line', 'speaker', 'message', 'sentiment', 'score',
+           'filler_words_ratio', 'date']
+
+
+def part_schema(run_date=None):
+    '''Returns the Arrow schema of the part files (same for all of them).
+    line is the (1-based) line of the message in its transcript. With
+    run_date, the date of the batch run is kept in its metadata.'''
+    import pyarrow as pa
+    metadata = {'run_date': run_date.isoformat()} if run_date else None
+    return pa.schema([('transcript', pa.string()), ('line', pa.int64()),
+                      ('speaker', pa.string()), ('message', pa.string()),
+                      ('sentiment', pa.string()), ('score', pa.float64()),
+                      ('filler_words_ratio', pa.float64()), ('date', pa.date32())],
+                     metadata=metadata)
+
+# filled in by _init_worker in every worker process
+_worker = {}
+
+
+def _init_worker(config_file, filler_words_file):
+    '''Sets up the models and fillers of a worker process once.'''
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    models_config = config['MODELS'] if config.has_section('MODELS') else {}
+    models.configure(models_config)
+    cache.configure(config['DEFAULT'])
+
+    filler_mode = config['DEFAULT'].get('filler_mode', 'spacy')
+    models.warm_up(['sentiment', 'spacy'] if filler_mode == 'spacy' else ['sentiment'])
+
+    _worker['filler_words'] = read_fillers_from_file(filler_words_file)
+    _worker['filler_mode'] = filler_mode
+    _worker['batch_size'] = config['DEFAULT'].getint('sentiment_batch_size', 32)
+
+
+def part_path(output_dir, transcript_path):
+    '''Returns the Parquet part file of a transcript.'''
+    name = os.path.splitext(os.path.basename(transcript_path))[0]
+    return os.path.join(output_dir, f"{name}.parquet")
+
+
+def analyze_transcript(transcript_path, output_dir, run_date=None):
+    '''Analyzes one transcript in a worker and writes its part file.
+    The transcript is parsed and analyzed chunk by chunk (see parsing.py)
+    and every chunk is written as a row group, so memory use does not
+    grow with the transcript. run_date is the date of the batch run
+    (default: today). Returns the number of messages analyzed.'''
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    date = run_date or datetime.date.today()
+    schema = part_schema(date)
+    name = os.path.basename(transcript_path)
+    chunks = iter_sentiment_chunks(
+        iter_file_turns(transcript_path,
+                        on_error=lambda line_no, line: print(f"{name}:{line_no}: skipping malformed line")),
+        _worker['filler_words'], batch_size=_worker['batch_size'],
+        filler_mode=_worker['filler_mode'], line_numbers=True)
+
+    # write to a temporary file first so a crash never leaves a half
+    # written part behind (which would be skipped when resuming); its
+    # name starts with '.', so pyarrow skips it when reading the dataset
+    path = part_path(output_dir, transcript_path)
+    tmp_path = os.path.join(output_dir, f".{os.path.basename(path)}.tmp")
+    n_messages = 0
+    writer = None
+    try:
+        for line_nos, results in chunks:
+            # the chunk is already columnar (see results.py), only the
+            # categorical columns are decoded to plain strings
+            n = len(results)
+            columns = results.table
+            table = pa.Table.from_arrays(
+                [pa.array([name] * n, pa.string()),
+                 pa.array(line_nos, pa.int64()),
+                 columns['speaker'].cast(pa.string()), columns['message'],
+                 columns['sentiment'].cast(pa.string()), columns['score'],
+                 columns['filler_words_ratio'], pa.array([date] * n, pa.date32())],
+                schema=schema)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, schema)
+            writer.write_table(table)
+            n_messages += n
+        if writer is None:
+            # no messages at all, still mark the transcript as done
+            pq.write_table(schema.empty_table(), tmp_path)
+    finally:
+        if writer is not None:
+            writer.close()
+    os.replace(tmp_path, path)
+    return n_messages
+
+
+def run_batch(input_dir, output_dir, pattern='*.txt', workers=None,
+              config_file='config.ini', filler_words_file='filler_words.txt'):
+    '''Analyzes all transcripts in input_dir that have no part file in
+    output_dir yet. Returns the list of transcripts that failed.'''
+    os.makedirs(output_dir, exist_ok=True)
+    transcripts = sorted(glob.glob(os.path.join(input_dir, pattern)))
+    todo = [t for t in transcripts if not os.path.exists(part_path(output_dir, t))]
+    print(f"{len(transcripts) - len(todo)} of {len(transcripts)} transcripts already done.")
+
+    # the date of all parts of this run (see part_schema)
+    run_date = datetime.date.today()
+    failed = []
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=_init_worker,
+                             initargs=(config_file, filler_words_file)) as pool:
+        futures = {pool.submit(analyze_transcript, t, output_dir, run_date): t for t in todo}
+        for done, future in enumerate(as_completed(futures), start=1):
+            transcript = futures[future]
+            try:
+                n_messages = future.result()
+                print(f"[{done}/{len(todo)}] {transcript}: {n_messages} messages")
+            except Exception as e:
+                # the transcript is retried on the next run
+                failed.append(transcript)
+                print(f"[{done}/{len(todo)}] {transcript}: failed ({e})")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze a directory of transcripts.")
+    parser.add_argument('input_dir', help="directory with the transcript files")
+    parser.add_argument('-o', '--output', default='results',
+                        help="output directory of the Parquet dataset (default: results)")
+    parser.add_argument('--pattern', default='*.txt',
+                        help="glob pattern of transcript files (default: *.txt)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="number of worker processes (default: number of CPUs)")
+    parser.add_argument('--config', default='config.ini')
+    args = parser.parse_args()
+
+    config = configparser.ConfigParser()
+    config.read(args.config)
+    filler_words_file = config['DEFAULT'].get('filler_words_file', 'filler_words.txt')
+
+    failed = run_batch(args.input_dir, args.output, pattern=args.pattern,
+                       workers=args.workers, config_file=args.config,
+                       filler_words_file=filler_words_file)
+    if failed:
+        raise SystemExit(f"{len(failed)} transcripts failed, re-run to retry them.")
+
+
+if __name__ == "__main__":
+    main()
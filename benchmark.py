@@ -0,0 +1,253 @@
+"""
+Author: Sobhan
+Date: 17-10-2026
+Project: Bones Ltd. job technical challenge.
+File: benchmark.py
+Description and Usage:
+   Benchmarks every stage of the pipeline on synthetic transcripts of
+   growing size: parsing, compute_filler_ratio (both modes),
+   compute_sentiment, building the analytics frame and drawing each
+   chart of render_and_visualize().
+   The transcripts are generated deterministically (same seed, same
+   transcript), so runs on different commits can be compared. Results
+   are saved as JSON; --compare prints the speedup against an older file.
+   The import time of app.py (dashboard cold start) is measured too.
+   Stages whose dependencies are missing (e.g. no spaCy model) are
+   reported as skipped instead of failing the run; the dataframe and
+   chart stages then use made-up results of the same size.
+
+   Suggested run commands:
+      > python benchmark.py --sizes 10 100 1000 -o benchmark_results.json
+      > python benchmark.py --compare old_results.json
+      > python benchmark.py --startup-only
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+from parsing import iter_conversation_turns
+from utils import read_fillers_from_file
+
+SIZES = [10, 100, 1000, 10000, 100000]
+
+# importing app.py must stay below this many seconds, without loading
+# any of the HEAVY_MODULES (they are imported when their feature is used)
+STARTUP_BUDGET_S = 5.0
+HEAVY_MODULES = ['transformers', 'torch', 'spacy', 'langchain', 'langchain_groq',
+                 'langchain_core', 'text2emotion', 'nltk', 'seaborn', 'matplotlib']
+
+_WORDS = ("the call went fine and we talked about the new plan for next week "
+          "I was not happy with the price but the support team was great "
+          "honestly it took too long to get an answer from anyone there "
+          "we should meet again soon to check how the project is going").split()
+
+
+def generate_transcript(n_lines, filler_words, filler_density=0.1,
+                        speakers=("Speaker A", "Speaker B"), seed=0):
+    '''Returns a synthetic 'Speaker X: ...' transcript of n_lines lines.
+    About filler_density of the words are fillers from filler_words.
+    The same arguments always give the same transcript.'''
+    rng = random.Random(seed)
+    lines = []
+    speaker = 0
+    for _ in range(n_lines):
+        # mostly alternating speakers, sometimes the same one goes on
+        if rng.random() < 0.8:
+            speaker = (speaker + 1) % len(speakers)
+        words = []
+        for _ in range(rng.randint(4, 30)):
+            if filler_words and rng.random() < filler_density:
+                words.append(rng.choice(filler_words))
+            else:
+                words.append(rng.choice(_WORDS))
+        message = ' '.join(words)
+        lines.append(f"{speakers[speaker]}: {message[0].upper()}{message[1:]}.")
+    return '\n'.join(lines)
+
+
+def synthetic_results(conversation, seed=0):
+    '''Returns made-up analysis results (with emotions) for conversation,
+    used for the dataframe and chart stages when the models are missing.'''
+    from analysis import EMOTION_COLS
+    rng = random.Random(seed)
+    results = []
+    for turn in iter_conversation_turns(conversation):
+        entry = {"speaker": turn.speaker, "message": turn.message,
+                 "sentiment": rng.choice(["POSITIVE", "NEGATIVE"]),
+                 "score": rng.uniform(0.5, 1.0),
+                 "filler_words_ratio": rng.uniform(0.0, 0.3)}
+        entry.update({col: rng.random() for col in EMOTION_COLS})
+        results.append(entry)
+    return results
+
+
+def _time(func, repeat=1):
+    '''Returns the best wall time of func() over repeat runs (seconds).'''
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _stages(conversation, filler_words):
+    '''Yields (stage name, function) for every stage to time.'''
+    from analysis import compute_filler_ratio, compute_sentiment, add_emotions
+    from analytics import AnalyticsFrame
+    from utils import CHART_OPTIONS, draw_chart
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    def parse():
+        # the parser the analysis uses (see parsing.py)
+        return list(iter_conversation_turns(conversation))
+
+    messages = [turn.message for turn in parse()]
+    yield "parse", parse
+    for mode in ('fast', 'spacy'):
+        yield f"filler_ratio[{mode}]", lambda mode=mode: [
+            compute_filler_ratio(msg, filler_words, mode=mode) for msg in messages]
+
+    state = {}
+
+    def sentiment():
+        state['results'] = compute_sentiment(conversation, filler_words, filler_mode='fast')
+    yield "sentiment", sentiment
+
+    def emotions():
+        results = state.get('results') or synthetic_results(conversation)
+        state['results'] = add_emotions(results, workers=1)
+    yield "emotions", emotions
+
+    def frame():
+        results = state.get('results')
+        if results is None or 'Happy' not in results[0]:
+            results = synthetic_results(conversation)
+        state['frame'] = AnalyticsFrame(results)
+    yield "dataframe", frame
+
+    for option in CHART_OPTIONS:
+        def chart(option=option):
+            fig = draw_chart(option, state['frame'])
+            fig.canvas.draw()
+            plt.close(fig)
+        yield f"chart[{option}]", chart
+
+
+def run_benchmark(sizes=SIZES, filler_words_file='filler_words.txt',
+                  filler_density=0.1, repeat=1, seed=0, max_seconds=None):
+    '''Times every stage for every transcript size and returns the results
+    as a dict (see save_results). A stage that failed once is skipped for
+    larger sizes, as is a stage that took longer than max_seconds.'''
+    import cache
+    # timings must not come from cached results
+    cache.configure({})
+    filler_words = read_fillers_from_file(filler_words_file)
+    timings = {}
+    skipped = {}
+    for n_lines in sizes:
+        conversation = generate_transcript(n_lines, filler_words,
+                                           filler_density=filler_density, seed=seed)
+        for name, func in _stages(conversation, filler_words):
+            if name in skipped:
+                continue
+            try:
+                seconds = _time(func, repeat=repeat)
+            except Exception as e:
+                skipped[name] = f"{type(e).__name__}: {e}"
+                print(f"{n_lines:>7} lines  {name:<45} skipped ({skipped[name]})")
+                continue
+            timings.setdefault(name, {})[str(n_lines)] = seconds
+            print(f"{n_lines:>7} lines  {name:<45} {seconds * 1000:10.1f} ms")
+            if max_seconds is not None and seconds > max_seconds:
+                skipped[name] = f"took longer than {max_seconds}s"
+
+    return {
+        "created": datetime.datetime.now().isoformat(timespec='seconds'),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "config": {"sizes": list(sizes), "filler_density": filler_density,
+                   "repeat": repeat, "seed": seed},
+        "timings": timings,
+        "skipped": skipped,
+    }
+
+
+def measure_startup(module='app', entry='setup', config_file=None):
+    '''Runs, in a fresh interpreter and from this directory (so with the
+    shipped config.ini unless config_file is given to entry), what comes
+    before the first render: importing module and calling its entry
+    function (none: the import only). Returns the time (seconds) and the
+    heavy modules it pulled in.'''
+    args = repr(config_file) if config_file else ""
+    code = (f"import json, sys, time\n"
+            f"start = time.perf_counter()\n"
+            f"import {module}\n"
+            + (f"{module}.{entry}({args})\n" if entry else "")
+            + f"seconds = time.perf_counter() - start\n"
+            f"heavy = [m for m in {HEAVY_MODULES!r} if m in sys.modules]\n"
+            f"print(json.dumps({{'seconds': seconds, 'heavy_modules': heavy}}))")
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                         check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def save_results(results, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+
+
+def compare_results(old, new):
+    '''Prints the speedup of new over old for every stage and size.'''
+    for name, new_timings in new["timings"].items():
+        for size, seconds in new_timings.items():
+            before = old["timings"].get(name, {}).get(size)
+            if before:
+                print(f"{size:>7} lines  {name:<45} {before / seconds:6.2f}x "
+                      f"({before * 1000:.1f} -> {seconds * 1000:.1f} ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analysis pipeline.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES,
+                        help="transcript sizes in lines (default: %(default)s)")
+    parser.add_argument('--filler-density', type=float, default=0.1)
+    parser.add_argument('--repeat', type=int, default=1,
+                        help="runs per stage, the best one is kept")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-seconds', type=float, default=60,
+                        help="skip a stage for larger sizes once it takes longer")
+    parser.add_argument('-o', '--output', default='benchmark_results.json')
+    parser.add_argument('--compare', help="an older results file to compare with")
+    parser.add_argument('--startup-only', action='store_true',
+                        help="only measure the import time of app.py")
+    args = parser.parse_args()
+
+    startup = measure_startup()
+    print(f"Startup: import app and setup() in {startup['seconds']:.2f}s "
+          f"(budget {STARTUP_BUDGET_S}s), heavy modules: {startup['heavy_modules'] or 'none'}")
+    if args.startup_only:
+        return
+
+    results = run_benchmark(sizes=args.sizes, filler_density=args.filler_density,
+                            repeat=args.repeat, seed=args.seed,
+                            max_seconds=args.max_seconds)
+    results["startup"] = startup
+    save_results(results, args.output)
+    print(f"Results saved to {args.output}")
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare_results(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
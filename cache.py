@@ -0,0 +1,148 @@
+"""
+Author: Sobhan
+Date: 17-10-2026
+Project: Bones Ltd. job technical challenge.
+File: cache.py
+Description and Usage:
+   A persistent (SQLite) cache of per-message analysis results, so the
+   sentiment, filler ratio and emotion of a message are only computed
+   once, even across restarts of the app.
+   Entries are content-addressed: the key is a hash of the message text
+   and of everything the result depends on (model name/version, filler
+   list, ...), so a changed model or filler list never returns stale
+   results. The cache holds at most max_entries results and drops the
+   least recently used ones first.
+
+   Usage:
+      import cache
+      cache.configure(config['DEFAULT'])      # once, from config.ini
+      result_cache = cache.get_cache()        # None if disabled
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+
+def cache_key(*parts):
+    '''Returns the hash key of the given parts (strings).'''
+    return hashlib.sha256('\x1f'.join(str(p) for p in parts).encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    '''Size-bounded LRU cache of JSON-serializable values in SQLite.'''
+
+    def __init__(self, path, max_entries=1_000_000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Streamlit serves every session in its own thread
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, last_used INTEGER NOT NULL)")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS results_last_used ON results(last_used)")
+        # kept up to date by put_many, so it never has to count the table
+        # (entries added by other processes sharing the file are counted
+        # when it is opened)
+        (self._entries,) = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()
+
+    def get_many(self, keys):
+        '''Returns {key: value} for the keys found in the cache.'''
+        found = {}
+        with self._lock:
+            unique = list(dict.fromkeys(keys))
+            # stay below SQLite's limit on the number of query parameters
+            for start in range(0, len(unique), 500):
+                chunk = unique[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM results WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk).fetchall()
+                found.update((key, json.loads(value)) for key, value in rows)
+            if found:
+                now = time.time_ns()
+                with self._conn:
+                    self._conn.executemany("UPDATE results SET last_used = ? WHERE key = ?",
+                                           [(now, key) for key in found])
+            self.hits += sum(1 for key in keys if key in found)
+            self.misses += sum(1 for key in keys if key not in found)
+        return found
+
+    def put_many(self, items):
+        '''Stores the (key, value) pairs and evicts the least recently used
+        entries if the cache grew above max_entries.'''
+        items = dict(items)
+        now = time.time_ns()
+        with self._lock, self._conn:
+            keys = list(items)
+            existing = 0
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                (n,) = self._conn.execute(
+                    f"SELECT COUNT(*) FROM results WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk).fetchone()
+                existing += n
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO results (key, value, last_used) VALUES (?, ?, ?)",
+                [(key, json.dumps(value), now) for key, value in items.items()])
+            self._entries += len(keys) - existing
+            if self._entries > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM results WHERE rowid IN "
+                    "(SELECT rowid FROM results ORDER BY last_used LIMIT ?)",
+                    (self._entries - self.max_entries,))
+                self._entries = self.max_entries
+
+    def cached(self, keys, compute):
+        '''Returns the values of keys, calling compute(missing_indexes) for
+        the ones not in the cache; it must return their values in order.'''
+        found = self.get_many(keys)
+        missing = [i for i, key in enumerate(keys) if key not in found]
+        if missing:
+            computed = compute(missing)
+            items = list(zip((keys[i] for i in missing), computed))
+            self.put_many(items)
+            found.update(items)
+        return [found[key] for key in keys]
+
+    def stats(self):
+        '''Returns the hit/miss counters and the number of entries.'''
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / total if total else 0.0,
+                    "entries": self._entries}
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM results")
+            self._entries = 0
+
+
+_cache = None
+
+
+def configure(section):
+    '''Opens the cache set in a config.ini section (cache_file and
+    cache_max_entries). An empty cache_file disables the cache.'''
+    global _cache
+    path = section.get('cache_file', '')
+    max_entries = int(section.get('cache_max_entries', 1_000_000))
+    if not path:
+        _cache = None
+    elif _cache is None or _cache.path != path:
+        _cache = ResultCache(path, max_entries)
+    else:
+        _cache.max_entries = max_entries
+
+
+def get_cache():
+    '''Returns the configured ResultCache, or None if caching is off.'''
+    return _cache
@@ -0,0 +1,86 @@
+"""
+Author: Sobhan
+Date: 17-10-2026
+Project: Bones Ltd. job technical challenge.
+File: fake_llm.py
+Description and Usage:
+   Local stand-ins for the Groq chat model, so the LLM features can be
+   tested (and load tested) without an API key or network access.
+
+   Usage:
+      from fake_llm import FakeTaggingLLM, FakeConversationLLM
+      llm = FakeTaggingLLM(tags={...})    # instead of setup_llm()
+      llm = FakeConversationLLM(latency=0.5)
+"""
+
+import asyncio
+import json
+import time
+from typing import Any, Dict, List
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+
+class FakeTaggingLLM(BaseChatModel):
+    '''Answers every tagging request with the same tags, the way a model
+    with function calling does. The first `failures` calls raise an error
+    (to exercise retries).'''
+
+    tags: Dict[str, Any] = {}
+    failures: int = 0
+    calls: int = 0
+
+    @property
+    def _llm_type(self):
+        return "fake-tagging"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise RuntimeError("fake model failure")
+        message = AIMessage(content="", additional_kwargs={
+            "function_call": {"name": "information_extraction",
+                              "arguments": json.dumps(self.tags)}})
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class FakeConversationLLM(BaseChatModel):
+    '''Answers every request with a new synthetic 'Speaker A/B:'
+    conversation (see benchmark.generate_transcript), after `latency`
+    seconds like a remote model would. The first `failures` calls raise an
+    error and the next `malformed` ones answer with an introduction line
+    and no speakers (to exercise retries and validation).'''
+
+    filler_words: List[str] = ['um', 'uh', 'like', 'you know', 'actually']
+    n_lines: int = 16
+    latency: float = 0.0
+    failures: int = 0
+    malformed: int = 0
+    seed: int = 0
+    calls: int = 0
+
+    @property
+    def _llm_type(self):
+        return "fake-conversation"
+
+    def _reply(self):
+        from benchmark import generate_transcript
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise RuntimeError("fake model failure")
+        if self.calls <= self.failures + self.malformed:
+            content = "Sure! Here is a sample conversation between two friends."
+        else:
+            content = generate_transcript(self.n_lines, self.filler_words,
+                                          seed=self.seed + self.calls)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        return self._reply()
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        return self._reply()
@@ -0,0 +1,205 @@
+"""
+Author: Sobhan
+Date: 17-10-2026
+Project: Bones Ltd. job technical challenge.
+File: generate.py
+Description and Usage:
+   Bulk generation of sample conversations (the same prompt as
+   gen_auto_sample_conversation) to build large corpora for load testing.
+   The conversations are requested concurrently (at most `concurrency` at
+   a time) and never faster than `rate_limit` requests per second. An
+   answer that is not a 'Speaker A/B:' conversation is rejected and asked
+   again, as is a failed request, with a capped exponential backoff; all
+   these retries share one retry budget for the whole run.
+   Every conversation is written to its own file in the corpus directory
+   (which batch.py can analyze). Re-running the same command only
+   generates the missing files.
+   With --fake the local FakeConversationLLM (see fake_llm.py) is used
+   instead of the Groq model, so no API key or network is needed.
+
+   Suggested run commands:
+      > python generate.py corpus/ -n 100
+      > python generate.py corpus/ -n 10000 --fake --rate-limit 0
+"""
+
+import argparse
+import asyncio
+import configparser
+import os
+import random
+import time
+
+from utils import sample_conversation_messages, setup_llm
+
+SPEAKERS = ('Speaker A', 'Speaker B')
+TOPICS = ['a football game', 'a holiday trip', 'a delayed delivery', 'a job interview',
+          'a new phone', 'moving house', 'a birthday party', 'a broken laptop',
+          'a restaurant', 'the weather', 'a phone bill', 'a concert']
+
+
+def validate_conversation(text, speakers=SPEAKERS, min_turns=4):
+    '''Returns the conversation in text as 'Speaker: message' lines, or
+    raises ValueError if it doesn't follow that format.
+    Blank lines and an introduction before the first turn are dropped.'''
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    prefixes = tuple(f"{speaker}:" for speaker in speakers)
+    start = next((i for i, line in enumerate(lines) if line.startswith(prefixes)), None)
+    if start is None:
+        raise ValueError("no 'Speaker:' lines in the answer")
+    lines = lines[start:]
+    for line in lines:
+        if not line.startswith(prefixes):
+            raise ValueError(f"line not starting with a speaker: {line[:60]!r}")
+    if len(lines) < min_turns:
+        raise ValueError(f"only {len(lines)} turns")
+    missing = [s for s in speakers if not any(line.startswith(f"{s}:") for line in lines)]
+    if missing:
+        raise ValueError(f"{', '.join(missing)} never speaks")
+    return '\n'.join(lines) + '\n'
+
+
+class RateLimiter:
+    '''Lets at most `rate` acquisitions per second through (0: no limit),
+    spaced evenly.'''
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class RetryBudget:
+    '''The number of retries left for the whole run.'''
+
+    def __init__(self, retries):
+        self.left = retries
+
+    def take(self):
+        '''Uses one retry; returns False once the budget is spent.'''
+        if self.left <= 0:
+            return False
+        self.left -= 1
+        return True
+
+
+def corpus_path(output_dir, index):
+    return os.path.join(output_dir, f"conversation_{index:05d}.txt")
+
+
+async def _generate_one(llm, index, output_dir, semaphore, limiter, budget, stats,
+                        base_delay, max_delay):
+    async with semaphore:
+        attempt = 0
+        while True:
+            await limiter.acquire()
+            try:
+                topic = TOPICS[index % len(TOPICS)]
+                response = await llm.ainvoke(sample_conversation_messages(topic))
+                conversation = validate_conversation(response.content)
+                break
+            except Exception as e:
+                stats['rejected' if isinstance(e, ValueError) else 'errors'] += 1
+                if not budget.take():
+                    print(f"conversation {index}: giving up, retry budget spent ({e})")
+                    stats['failed'] += 1
+                    return
+                # capped exponential backoff with jitter
+                delay = min(max_delay, base_delay * 2 ** attempt) * random.uniform(0.5, 1)
+                attempt += 1
+                print(f"conversation {index}: retrying in {delay:.1f}s ({e})")
+                await asyncio.sleep(delay)
+
+    # write to a temporary file first so a crash never leaves a half
+    # written conversation behind (which would be skipped when resuming)
+    path = corpus_path(output_dir, index)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(conversation)
+    os.replace(path + '.tmp', path)
+    stats['generated'] += 1
+
+
+async def generate_corpus_async(output_dir, n, llm, concurrency=4, rate_limit=1.0,
+                                retry_budget=20, base_delay=1.0, max_delay=30.0):
+    '''Coroutine of generate_corpus().'''
+    os.makedirs(output_dir, exist_ok=True)
+    todo = [i for i in range(n) if not os.path.exists(corpus_path(output_dir, i))]
+    print(f"{n - len(todo)} of {n} conversations already generated.")
+    stats = {'generated': 0, 'rejected': 0, 'errors': 0, 'failed': 0}
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = RateLimiter(rate_limit)
+    budget = RetryBudget(retry_budget)
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        _generate_one(llm, i, output_dir, semaphore, limiter, budget, stats,
+                      base_delay, max_delay)
+        for i in todo))
+    stats['seconds'] = time.perf_counter() - start
+    stats['retries_left'] = budget.left
+    return stats
+
+
+def generate_corpus(output_dir, n, llm=None, concurrency=4, rate_limit=1.0,
+                    retry_budget=20, base_delay=1.0, max_delay=30.0):
+    '''Generates n conversations into output_dir (conversation_00000.txt,
+    ...), skipping the ones already there. llm defaults to the shared Groq
+    model. rate_limit is in requests per second (0: no limit) and
+    retry_budget the number of retries (failed requests or rejected
+    answers) allowed for the whole run. Returns the run stats.'''
+    if llm is None:
+        llm = setup_llm()
+    return asyncio.run(generate_corpus_async(
+        output_dir, n, llm, concurrency=concurrency, rate_limit=rate_limit,
+        retry_budget=retry_budget, base_delay=base_delay, max_delay=max_delay))
+
+
+def main():
+    config = configparser.ConfigParser()
+    config.read('config.ini')
+    defaults = config['DEFAULT']
+
+    parser = argparse.ArgumentParser(description="Generate a corpus of sample conversations.")
+    parser.add_argument('output_dir', help="directory the conversations are written to")
+    parser.add_argument('-n', type=int, default=100, help="number of conversations (default: 100)")
+    parser.add_argument('--concurrency', type=int,
+                        default=defaults.getint('generate_concurrency', 4))
+    parser.add_argument('--rate-limit', type=float,
+                        default=defaults.getfloat('generate_rate_limit', 1.0),
+                        help="requests per second, 0 for no limit (default: %(default)s)")
+    parser.add_argument('--retry-budget', type=int,
+                        default=defaults.getint('generate_retry_budget', 20),
+                        help="retries allowed for the whole run (default: %(default)s)")
+    parser.add_argument('--fake', action='store_true',
+                        help="use the local FakeConversationLLM instead of Groq")
+    parser.add_argument('--fake-latency', type=float, default=0.0,
+                        help="seconds the fake model takes per answer")
+    args = parser.parse_args()
+
+    llm = None
+    if args.fake:
+        from fake_llm import FakeConversationLLM
+        llm = FakeConversationLLM(latency=args.fake_latency)
+    else:
+        import models
+        models.configure(config['MODELS'] if config.has_section('MODELS') else {})
+
+    stats = generate_corpus(args.output_dir, args.n, llm=llm, concurrency=args.concurrency,
+                            rate_limit=args.rate_limit, retry_budget=args.retry_budget)
+    print(f"Generated {stats['generated']} conversations in {stats['seconds']:.1f}s "
+          f"({stats['rejected']} rejected answers, {stats['errors']} failed requests, "
+          f"{stats['retries_left']} retries left)")
+    if stats['failed']:
+        raise SystemExit(f"{stats['failed']} conversations failed, re-run to retry them.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,471 @@
+"""
+Author: Sobhan
+Date: 17-10-2026
+Project: Bones Ltd. job technical challenge.
+File: inference.py
+Description and Usage:
+   An optional local inference worker: one process that owns the
+   sentiment and spaCy models for all Streamlit sessions (instead of
+   loading them in the app process) and is reached over a Unix socket.
+   Requests of concurrent sessions are merged into micro-batches: the
+   worker waits at most max_wait_ms after the first request for others
+   to arrive, up to max_batch messages, and runs them through the model
+   at once. The worker keeps its queue depth, batch sizes and latencies;
+   stats() returns them (shown in the Performance panel).
+   When it is turned on (inference_worker in config.ini) and nobody is
+   listening on the socket yet, the app starts the worker itself, in the
+   background: until it accepts connections, get_client() returns None
+   and the app computes in its own process. The worker can also be run
+   on its own and shared by several app processes. Every
+   request names the model (spec) it is for, and the worker switches to
+   it if needed, so its results always match the cache keys of the app.
+   The socket is only accessible to the user running the worker, and
+   clients authenticate with a secret kept next to it (<socket>.key).
+
+   Usage:
+      import inference
+      inference.configure(config['DEFAULT'], config['MODELS'])
+      client = inference.get_client()     # None if turned off (or not ready yet)
+      client.sentiment(messages)
+
+   Suggested run command (stand-alone worker):
+      > python inference.py
+"""
+
+import argparse
+import configparser
+import itertools
+import multiprocessing
+import os
+import queue
+import secrets
+import statistics
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from multiprocessing.connection import Client, Listener
+
+import perf
+
+# the last requests / batches the stats are computed over
+_STATS_WINDOW = 1000
+
+
+class _Request:
+
+    def __init__(self, request_id, kind, key, messages, reply):
+        self.request_id = request_id
+        self.kind = kind
+        self.key = key
+        self.messages = messages
+        self.reply = reply
+        self.enqueued = time.perf_counter()
+
+
+class InferenceServer:
+    '''Runs the requests put in its queue in micro-batches (one thread).
+    Requests of the same kind and key (e.g. the same filler list) are
+    merged into one batch.'''
+
+    def __init__(self, max_batch=64, max_wait_ms=10):
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending_messages = 0
+        self._latencies = deque(maxlen=_STATS_WINDOW)
+        self._batch_sizes = deque(maxlen=_STATS_WINDOW)
+        self._served = 0
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, request):
+        with self._lock:
+            self._pending_messages += len(request.messages)
+        self.queue.put(request)
+
+    def _next_batch(self):
+        '''Blocks for a request, then gathers the ones arriving within
+        max_wait (up to max_batch messages).'''
+        batch = [self.queue.get()]
+        size = len(batch[0].messages)
+        deadline = batch[0].enqueued + self.max_wait
+        while size < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request.messages)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            groups = {}
+            for request in batch:
+                groups.setdefault((request.kind, request.key), []).append(request)
+            for (kind, key), requests in groups.items():
+                messages = [msg for request in requests for msg in request.messages]
+                try:
+                    outputs, ok = _compute(kind, key, messages, self.max_batch), True
+                except Exception as e:
+                    outputs, ok = f"{type(e).__name__}: {e}", False
+                start = 0
+                done = time.perf_counter()
+                for request in requests:
+                    n = len(request.messages)
+                    request.reply(request.request_id, ok,
+                                  outputs[start:start + n] if ok else outputs)
+                    start += n
+                    with self._lock:
+                        self._latencies.append(done - request.enqueued)
+                with self._lock:
+                    self._batch_sizes.append(len(messages))
+                    self._pending_messages -= len(messages)
+                    self._served += len(requests)
+
+    def stats(self):
+        '''Returns the queue depth (requests and messages waiting) and the
+        batch sizes and latencies (seconds) of the last requests.'''
+        with self._lock:
+            latencies = sorted(self._latencies)
+            batch_sizes = list(self._batch_sizes)
+            stats = {"queued_requests": self.queue.qsize(),
+                     "queued_messages": self._pending_messages,
+                     "served_requests": self._served}
+        if latencies:
+            stats.update(latency_p50_s=latencies[len(latencies) // 2],
+                         latency_p95_s=latencies[int(len(latencies) * 0.95)],
+                         latency_max_s=latencies[-1])
+        if batch_sizes:
+            stats["mean_batch_size"] = statistics.mean(batch_sizes)
+        return stats
+
+
+def _freeze_spec(spec):
+    # a model spec (name, version, config) as a hashable request key
+    if spec is None:
+        return None
+    name, version, config = spec
+    return (name, version, tuple(sorted(config.items())))
+
+
+def _use_spec(key, frozen_spec):
+    from models import registry
+    if frozen_spec is not None:
+        name, version, config = frozen_spec
+        registry.use_spec(key, (name, version, dict(config)))
+
+
+def _compute(kind, key, messages, batch_size):
+    '''Runs one merged batch in the worker process, with the model the
+    requests were made for (reloaded if the previous batch used another).'''
+    from analysis import batched_sentiment, compile_fillers, compute_filler_ratio
+    from models import get_model
+    if kind == 'sentiment':
+        _use_spec("sentiment", key)
+        return batched_sentiment(get_model("sentiment"), messages, batch_size=batch_size)
+    if kind == 'filler':
+        mode, filler_words, spacy_spec = key
+        if mode == 'spacy':
+            _use_spec("spacy", spacy_spec)
+        matcher = compile_fillers(filler_words)
+        return [compute_filler_ratio(msg, matcher, mode=mode) for msg in messages]
+    raise ValueError(f"Unknown request kind '{kind}'.")
+
+
+def authkey(address):
+    '''Returns the secret the worker at address and its clients
+    authenticate each other with. It is kept in <address>.key, readable by
+    this user only, and made by the first process that needs it.'''
+    path = address + '.key'
+    if not os.path.exists(path):
+        # written in full before it appears under its name
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(secrets.token_bytes(32))
+            try:
+                os.link(tmp_path, path)
+            except FileExistsError:
+                pass  # made by another process meanwhile
+        finally:
+            os.remove(tmp_path)
+    with open(path, 'rb') as file:
+        return file.read()
+
+
+def _serve_connection(conn, server):
+    send_lock = threading.Lock()
+
+    def reply(request_id, ok, value):
+        with send_lock:
+            try:
+                conn.send((request_id, ok, value))
+            except OSError:
+                pass  # the client went away
+
+    while True:
+        try:
+            request_id, kind, key, messages = conn.recv()
+        except (EOFError, OSError):
+            conn.close()
+            return
+        if kind == 'stats':
+            reply(request_id, True, server.stats())
+        else:
+            server.submit(_Request(request_id, kind, key, messages, reply))
+
+
+def listen(address):
+    '''Opens the worker's Unix socket at address, accessible to this user
+    only and to the clients that know authkey(address).'''
+    key = authkey(address)
+    if os.path.exists(address):
+        # left over by a worker that was killed
+        os.remove(address)
+    # requests are pickled, so the socket is created accessible to this
+    # user only (no window between bind and chmod), and clients must
+    # also know the key
+    umask = os.umask(0o077)
+    try:
+        return Listener(address, family='AF_UNIX', authkey=key)
+    finally:
+        os.umask(umask)
+
+
+def serve(address, models_section=None, max_batch=64, max_wait_ms=10, warm_up=('sentiment',),
+          listener=None):
+    '''Runs the worker: loads the models and serves the clients connecting
+    to the Unix socket at address until the process is stopped. listener
+    is listen(address) when it was opened already (e.g. by a caller that
+    closes it), by default it is opened here.'''
+    import models
+    models.configure(models_section or {})
+    models.warm_up(list(warm_up))
+    server = InferenceServer(max_batch=max_batch, max_wait_ms=max_wait_ms)
+    if listener is None:
+        listener = listen(address)
+    with listener:
+        print(f"Inference worker listening on {address} "
+              f"(max_batch={max_batch}, max_wait_ms={max_wait_ms})")
+        while True:
+            try:
+                conn = listener.accept()
+            except (multiprocessing.AuthenticationError, EOFError, ConnectionError):
+                # a client without the key, or gone during the handshake
+                continue
+            threading.Thread(target=_serve_connection, args=(conn, server), daemon=True).start()
+
+
+class InferenceClient:
+    '''Connection of a process to the worker, shared by all its threads
+    (sessions). Replies are matched to requests by id, so any number of
+    requests can be in flight at once. Once the worker went away, closed
+    is set and every request fails (get_client() then makes a new client).'''
+
+    def __init__(self, address, timeout=300):
+        self.address = address
+        self.timeout = timeout
+        self._conn = Client(address, family='AF_UNIX', authkey=authkey(address))
+        self.closed = False
+        self._send_lock = threading.Lock()
+        self._ids = itertools.count()
+        self._pending = {}
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        while True:
+            try:
+                request_id, ok, value = self._conn.recv()
+            except (EOFError, OSError) as e:
+                # set first, so a request added from now on fails in _call
+                self.closed = True
+                while self._pending:
+                    _, future = self._pending.popitem()
+                    future.set_exception(ConnectionError(f"Inference worker went away ({e})."))
+                return
+            future = self._pending.pop(request_id, None)
+            if future is None:
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(RuntimeError(f"Inference worker failed: {value}"))
+
+    def _call(self, kind, key=None, messages=()):
+        request_id = next(self._ids)
+        future = self._pending[request_id] = Future()
+        try:
+            if self.closed:
+                raise ConnectionError("the connection is closed")
+            with self._send_lock:
+                self._conn.send((request_id, kind, key, list(messages)))
+        except OSError as e:
+            self.closed = True
+            self._pending.pop(request_id, None)
+            raise ConnectionError(f"Inference worker went away ({e}).") from e
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            # a late reply is dropped by _read
+            self._pending.pop(request_id, None)
+            raise
+
+    def sentiment(self, messages, spec=None):
+        '''Returns the sentiment pipeline outputs ({'label', 'score'}) of
+        messages, from the model of spec ((name, version, config), as
+        returned by models.registry.spec; None: the worker's current one).'''
+        return self._call('sentiment', _freeze_spec(spec), messages)
+
+    def filler_ratios(self, messages, filler_words, mode='spacy', spacy_spec=None):
+        '''Returns compute_filler_ratio() of every message; in 'spacy' mode
+        with the spaCy model of spacy_spec (see sentiment()).'''
+        return self._call('filler', (mode, tuple(filler_words), _freeze_spec(spacy_spec)),
+                          messages)
+
+    def stats(self):
+        return self._call('stats')
+
+    def close(self):
+        self._conn.close()
+
+
+def start_worker(address, models_section=None, max_batch=64, max_wait_ms=10,
+                 warm_up=('sentiment',), timeout=120):
+    '''Starts the worker in a child process (stopped with this process)
+    and returns a client once it accepts connections.'''
+    process = multiprocessing.get_context('spawn').Process(
+        target=serve, args=(address, dict(models_section or {}), max_batch, max_wait_ms,
+                            tuple(warm_up)),
+        daemon=True)
+    process.start()
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return InferenceClient(address)
+        except (FileNotFoundError, ConnectionRefusedError):
+            if not process.is_alive() or time.monotonic() > deadline:
+                raise RuntimeError("The inference worker did not start.")
+            time.sleep(0.1)
+
+
+_client = None
+# the arguments of _connect() from the last configure(), to connect again
+# once the worker went away
+_settings = None
+# the thread connecting to (and maybe starting) the worker
+_connecting = None
+_lock = threading.Lock()
+
+
+def _connect(address, models_section, max_batch, max_wait_ms):
+    '''Returns a client of the worker at address, starting it if nobody
+    listens there.'''
+    warm_up = [k.strip() for k in models_section.get('warm_up', '').split(',')
+               if k.strip() in ('sentiment', 'spacy')]
+    try:
+        return InferenceClient(address)
+    except (FileNotFoundError, ConnectionRefusedError):
+        return start_worker(address, models_section, warm_up=warm_up,
+                            max_batch=max_batch, max_wait_ms=max_wait_ms)
+
+
+def _connect_quietly(settings):
+    global _client
+    try:
+        client = _connect(*settings)
+    except Exception as e:
+        # tried again by the next get_client()
+        perf.event("inference_worker_failed", error=str(e))
+        return
+    with _lock:
+        if _settings != settings:
+            # configured otherwise (or turned off) meanwhile
+            client.close()
+            return
+        _client = client
+
+
+def _start_connecting():
+    '''Connects to the worker (starting it if needed) in a daemon thread,
+    which is returned, unless one is already connecting. Called with
+    _lock held.'''
+    global _connecting
+    if _connecting is None or not _connecting.is_alive():
+        _connecting = threading.Thread(target=_connect_quietly, args=(_settings,),
+                                       name="inference-connect", daemon=True)
+        _connecting.start()
+    return _connecting
+
+
+def enabled():
+    '''Whether the worker is turned on (even if get_client() has no
+    client for it yet).'''
+    return _settings is not None
+
+
+def configure(section, models_section=None):
+    '''Connects to the worker from a config.ini section (inference_worker,
+    inference_socket, inference_max_batch, inference_max_wait_ms), and
+    starts it if nobody listens on the socket yet. Both happen in a
+    daemon thread, which is returned (None if there is nothing to do), so
+    the app renders meanwhile. A turned off worker (the default) makes
+    get_client() return None.
+    models_section only matters to a worker started from here: the model
+    specs are sent with every request.'''
+    global _client, _settings
+    turned_on = str(section.get('inference_worker', 'false')).lower() in ('1', 'true', 'yes', 'on')
+    with _lock:
+        if not turned_on:
+            _client = _settings = None
+            return None
+        address = os.path.abspath(section.get('inference_socket', 'inference.sock'))
+        _settings = (address, dict(models_section or {}),
+                     int(section.get('inference_max_batch', 64)),
+                     float(section.get('inference_max_wait_ms', 10)))
+        if _client is not None and not _client.closed and _client.address == address:
+            return None
+        _client = None
+        return _start_connecting()
+
+
+def get_client():
+    '''Returns the InferenceClient, or None if the worker is turned off or
+    not connected yet (the caller then computes in its own process). A
+    client whose worker went away is replaced, in the background, by a
+    new one (restarting the worker if needed).'''
+    global _client
+    client = _client
+    if client is not None and not client.closed:
+        return client
+    with _lock:
+        if _client is not None and _client.closed:
+            _client = None
+        if _client is None and _settings is not None:
+            _start_connecting()
+        return _client
+
+
+def main():
+    config = configparser.ConfigParser()
+    config.read('config.ini')
+    defaults = config['DEFAULT']
+    parser = argparse.ArgumentParser(description="Run the shared inference worker.")
+    parser.add_argument('--socket', default=defaults.get('inference_socket', 'inference.sock'))
+    parser.add_argument('--max-batch', type=int, default=defaults.getint('inference_max_batch', 64))
+    parser.add_argument('--max-wait-ms', type=float,
+                        default=defaults.getfloat('inference_max_wait_ms', 10))
+    args = parser.parse_args()
+    serve(os.path.abspath(args.socket),
+          config['MODELS'] if config.has_section('MODELS') else {},
+          max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+Author: Sobhan
+Date: 17-10-2026
+Project: Bones Ltd. job technical challenge.
+File: models.py
+Description and Usage:
+   A process-wide registry for the heavy models used by the app
+   (spaCy, the Hugging Face sentiment pipeline and the Groq chat client).
+   The sentiment model can run on CPU as the full precision PyTorch model,
+   int8 dynamically quantized or exported to ONNX Runtime (see
+   parity.py to check a backend against the default one).
+   Every model is loaded lazily the first time it is asked for and then
+   kept for the lifetime of the process, so it is shared by all Streamlit
+   sessions and reruns (Streamlit imports this module only once).
+   If the name, version or config of a model changes (e.g. config.ini
+   is edited), the old instance is evicted and reloaded on next use.
+
+   Usage:
+      from models import get_model
+      nlp = get_model("spacy")
+"""
+
+import contextlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+
+import perf
+
+
+def _load_spacy(name, version=None, **config):
+    import spacy
+    return spacy.load(name, **config)
+
+
+# backends of the sentiment model (sentiment_backend in config.ini)
+SENTIMENT_BACKENDS = ('pytorch', 'quantized', 'onnx')
+
+
+def onnx_export_path(name, version, export_dir):
+    '''Returns the directory of the ONNX export of a model revision.'''
+    return os.path.join(export_dir, re.sub(r'[^\w.-]', '_', f"{name}@{version or 'main'}"))
+
+
+def _onnx_export(name, version, export_dir):
+    '''Returns the directory of the ONNX export of the model, exporting it
+    the first time only: later processes load the saved export instead of
+    converting the model again on every cold start.'''
+    path = onnx_export_path(name, version, export_dir)
+    if os.path.exists(os.path.join(path, 'model.onnx')):
+        return path
+    from optimum.onnxruntime import ORTModelForSequenceClassification
+    os.makedirs(export_dir, exist_ok=True)
+    # exported next to its final place and renamed when complete, so an
+    # interrupted export is never loaded
+    tmp_path = tempfile.mkdtemp(prefix='.export-', dir=export_dir)
+    try:
+        model = ORTModelForSequenceClassification.from_pretrained(
+            name, revision=version, export=True)
+        model.save_pretrained(tmp_path)
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            # another process saved the same export first
+            if not os.path.exists(os.path.join(path, 'model.onnx')):
+                raise
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    return path
+
+
+def _load_sentiment(name, version=None, backend='pytorch', threads=0,
+                    onnx_dir='onnx_models', **config):
+    '''Loads the sentiment pipeline with one of SENTIMENT_BACKENDS:
+    'pytorch' the full precision model, 'quantized' the same model with its
+    Linear layers dynamically quantized to int8, 'onnx' an ONNX Runtime
+    export of it (needs requirements-onnx.txt), made once and kept under
+    onnx_dir. threads is the number of CPU threads used for inference
+    (0: the library default).'''
+    from transformers import AutoTokenizer, pipeline
+    if backend not in SENTIMENT_BACKENDS:
+        raise ValueError(f"Unknown sentiment backend '{backend}', "
+                         f"expected one of {', '.join(SENTIMENT_BACKENDS)}.")
+    if backend == 'onnx':
+        import onnxruntime
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        model = ORTModelForSequenceClassification.from_pretrained(
+            _onnx_export(name, version, onnx_dir), session_options=options)
+    else:
+        import torch
+        from transformers import AutoModelForSequenceClassification
+        if threads:
+            torch.set_num_threads(threads)
+        model = AutoModelForSequenceClassification.from_pretrained(name, revision=version)
+        if backend == 'quantized':
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear},
+                                                        dtype=torch.qint8)
+    tokenizer = AutoTokenizer.from_pretrained(name, revision=version)
+    return pipeline("sentiment-analysis", model=model, tokenizer=tokenizer, **config)
+
+
+def _load_groq(name, version=None, **config):
+    from dotenv import load_dotenv
+    from langchain_groq import ChatGroq
+    load_dotenv()
+    api_key = os.getenv("Groq_API_KEY")
+    if not api_key:
+        raise ValueError("Missing Groq_API_KEY in environment variables.")
+    return ChatGroq(model=name, groq_api_key=api_key, **config)
+
+
+class ModelRegistry:
+    '''Keeps one instance per registered model and loads it on demand.
+
+    A model is registered under a key (e.g. "spacy") with a loader and a
+    spec made of its name, version and extra config. Registering the same
+    key again with a different spec drops the loaded instance.
+    '''
+
+    def __init__(self):
+        self._specs = {}
+        self._models = {}
+        # guards the dicts only; a model loads under the lock of its key,
+        # so loading one model does not block the lookups of the others
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._use_locks = {}
+        # keys already warmed up in the background
+        self._warming = set()
+
+    def _key_lock(self, locks, key):
+        with self._lock:
+            return locks.setdefault(key, threading.Lock())
+
+    @staticmethod
+    def _fingerprint(name, version, config):
+        return (name, version, tuple(sorted(config.items())))
+
+    def register(self, key, loader, name, version=None, **config):
+        '''Registers (or re-registers) the model under key.'''
+        spec = (loader, name, version, config)
+        with self._lock:
+            old = self._specs.get(key)
+            if old is not None and old[0] is loader \
+                    and self._fingerprint(*old[1:]) == self._fingerprint(name, version, config):
+                # unchanged (e.g. a Streamlit rerun): a load in progress,
+                # like a background warm-up, is kept
+                return
+            self._models.pop(key, None)
+            self._specs[key] = spec
+
+    def use_spec(self, key, spec):
+        '''Re-registers key with spec ((name, version, config), as returned
+        by spec()) and its current loader; nothing changes if it is the
+        registered spec already.'''
+        name, version, config = spec
+        with self._lock:
+            loader = self._specs[key][0]
+        self.register(key, loader, name, version, **config)
+
+    def get(self, key):
+        '''Returns the model under key, loading it first if needed.'''
+        with self._lock:
+            if key in self._models:
+                return self._models[key]
+        with self._key_lock(self._load_locks, key):
+            with self._lock:
+                if key in self._models:
+                    # loaded by another thread meanwhile
+                    return self._models[key]
+                if key not in self._specs:
+                    raise KeyError(f"No model registered under '{key}'.")
+                spec = self._specs[key]
+            loader, name, version, config = spec
+            with perf.stage(f"model_load[{key}]", model=name):
+                model = loader(name, version, **config)
+            with self._lock:
+                # not kept if the key was re-registered while loading
+                if self._specs.get(key) is spec:
+                    self._models[key] = model
+            return model
+
+    @contextlib.contextmanager
+    def using(self, key):
+        '''Returns the model under key (a context manager) and keeps other
+        threads from using it meanwhile, for models that are not thread
+        safe (e.g. the Hugging Face pipeline and its fast tokenizer).'''
+        model = self.get(key)
+        with self._key_lock(self._use_locks, key):
+            yield model
+
+    def warm_up(self, keys=None, background=False):
+        '''Loads the given models (all registered ones by default) up front.
+        With background, they are loaded in a daemon thread (once per key),
+        which is returned, so the app renders meanwhile; a session needing
+        one of them before it is ready waits for that load (see get()).'''
+        keys = list(keys if keys is not None else self._specs)
+        if not background:
+            for key in keys:
+                self.get(key)
+            return None
+        with self._lock:
+            keys = [key for key in keys if key not in self._warming]
+            self._warming.update(keys)
+        if not keys:
+            return None
+        thread = threading.Thread(target=self._warm_up_quietly, args=(keys,),
+                                  name="model-warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    def _warm_up_quietly(self, keys):
+        for key in keys:
+            try:
+                self.get(key)
+            except Exception as e:
+                # reported again (to the session) when the model is used
+                perf.event("warm_up_failed", model=key, error=str(e))
+
+    def evict(self, key=None):
+        '''Drops a loaded model (or all of them) so it is reloaded on next use.'''
+        with self._lock:
+            if key is None:
+                self._models.clear()
+            else:
+                self._models.pop(key, None)
+
+    def is_loaded(self, key):
+        return key in self._models
+
+    def spec(self, key):
+        '''Returns (name, version, config) of the model under key.'''
+        _, name, version, config = self._specs[key]
+        return name, version, dict(config)
+
+
+registry = ModelRegistry()
+
+# defaults; configure() overrides them from the [MODELS] section of config.ini
+registry.register("spacy", _load_spacy, "en_core_web_sm")
+registry.register("sentiment", _load_sentiment,
+                  "distilbert/distilbert-base-uncased-finetuned-sst-2-english",
+                  version="af0f99b")
+registry.register("groq", _load_groq, "llama3-8b-8192")
+
+
+def configure(section):
+    '''Registers the models from a config.ini section (a mapping).
+    Models whose name or version changed are reloaded on next use.'''
+    registry.register("spacy", _load_spacy,
+                      section.get('spacy_model', 'en_core_web_sm'))
+    registry.register("sentiment", _load_sentiment,
+                      section.get('sentiment_model',
+                                  'distilbert/distilbert-base-uncased-finetuned-sst-2-english'),
+                      version=section.get('sentiment_revision', 'af0f99b') or None,
+                      backend=section.get('sentiment_backend', 'pytorch'),
+                      threads=int(section.get('sentiment_threads', 0) or 0),
+                      onnx_dir=section.get('sentiment_onnx_dir', 'onnx_models'))
+    registry.register("groq", _load_groq,
+                      section.get('groq_model', 'llama3-8b-8192'))
+
+
+def get_model(key):
+    '''Shortcut for registry.get(key).'''
+    return registry.get(key)
+
+
+def warm_up(keys=None, background=False):
+    '''Shortcut for registry.warm_up(keys, background).'''
+    return registry.warm_up(keys, background=background)
@@ -0,0 +1,104 @@
+"""
+Author: Sobhan
+Date: 17-10-2026
+Project: Bones Ltd. job technical challenge.
+File: parity.py
+Description and Usage:
+   Checks a sentiment backend (see models.py: 'quantized' or 'onnx')
+   against the default full precision 'pytorch' one on a set of
+   reference transcripts. Both backends label every message; the report
+   gives the label agreement, the drift of the signed sentiment score
+   (mean, max) and the throughput of each backend. The result cache is
+   not used, so both backends really run.
+
+   Suggested run commands:
+      > python parity.py --backend quantized
+      > python parity.py --backend onnx --threads 4 transcripts/*.txt
+"""
+
+import argparse
+import configparser
+import time
+
+import models
+from analysis import batched_sentiment
+from parsing import iter_file_turns
+
+# label agreement below this fails the check
+MIN_AGREEMENT = 0.99
+
+
+def signed_score(prediction):
+    '''The score of a prediction, negative for a NEGATIVE label.'''
+    return prediction['score'] if prediction['label'] == 'POSITIVE' else -prediction['score']
+
+
+def compare_predictions(reference, candidate):
+    '''Returns the label agreement and score drift of the candidate
+    predictions against the reference ones (same messages, same order).'''
+    if len(reference) != len(candidate):
+        raise ValueError("Both backends must label the same messages.")
+    if not reference:
+        raise ValueError("No messages to compare.")
+    agree = sum(r['label'] == c['label'] for r, c in zip(reference, candidate))
+    drift = [abs(signed_score(r) - signed_score(c)) for r, c in zip(reference, candidate)]
+    return {"messages": len(reference),
+            "agreement": agree / len(reference),
+            "mean_drift": sum(drift) / len(drift),
+            "max_drift": max(drift)}
+
+
+def run_parity(messages, backend, threads=0, batch_size=32, section=None, loader=None):
+    '''Labels messages with the default backend and with `backend` (the
+    model name and revision come from the [MODELS] section) and returns
+    compare_predictions() with the messages per second of both.
+    loader loads a pipeline (models' sentiment loader by default).'''
+    section = section or {}
+    loader = loader or models._load_sentiment
+    name = section.get('sentiment_model', models.registry.spec("sentiment")[0])
+    version = section.get('sentiment_revision', models.registry.spec("sentiment")[1]) or None
+    report = {"backend": backend, "threads": threads}
+    predictions = {}
+    # a registry of its own, so the app's shared models are left alone
+    registry = models.ModelRegistry()
+    for label, key_backend in (("reference", 'pytorch'), ("candidate", backend)):
+        registry.register(label, loader, name, version,
+                          backend=key_backend, threads=threads)
+        pipeline = registry.get(label)
+        start = time.perf_counter()
+        predictions[label] = batched_sentiment(pipeline, messages, batch_size=batch_size)
+        report[f"{label}_msgs_per_s"] = len(messages) / (time.perf_counter() - start)
+        registry.evict(label)
+    report.update(compare_predictions(predictions["reference"], predictions["candidate"]))
+    return report
+
+
+def main():
+    config = configparser.ConfigParser()
+    config.read('config.ini')
+    section = config['MODELS'] if config.has_section('MODELS') else {}
+
+    parser = argparse.ArgumentParser(description="Compare a sentiment backend with the default one.")
+    parser.add_argument('transcripts', nargs='*', default=['transcript.txt'],
+                        help="reference transcripts (default: transcript.txt)")
+    configured = section.get('sentiment_backend', 'pytorch')
+    parser.add_argument('--backend', choices=models.SENTIMENT_BACKENDS[1:],
+                        default=configured if configured != 'pytorch' else 'quantized')
+    parser.add_argument('--threads', type=int, default=int(section.get('sentiment_threads', 0) or 0))
+    parser.add_argument('--batch-size', type=int, default=32)
+    args = parser.parse_args()
+
+    messages = [turn.message for path in args.transcripts for turn in iter_file_turns(path)]
+    report = run_parity(messages, args.backend, threads=args.threads,
+                        batch_size=args.batch_size, section=section)
+    print(f"{report['messages']} messages, backend '{args.backend}' vs 'pytorch':")
+    print(f"  label agreement  {report['agreement']:.2%}")
+    print(f"  score drift      mean {report['mean_drift']:.4f}, max {report['max_drift']:.4f}")
+    print(f"  throughput       {report['candidate_msgs_per_s']:.1f} vs "
+          f"{report['reference_msgs_per_s']:.1f} messages/s")
+    if report['agreement'] < MIN_AGREEMENT:
+        raise SystemExit(f"Label agreement below {MIN_AGREEMENT:.0%}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Author: Sobhan
+Date: 17-10-2026
+Project: Bones Ltd. job technical challenge.
+File: parsing.py
+Description and Usage:
+   Streaming parser of 'Speaker: message' transcripts.
+   Instead of splitting the whole conversation string, the parsers yield
+   one Turn at a time, so a transcript of any size is parsed in constant
+   memory (files are memory-mapped and read line by line). Any number of
+   speakers is supported. Blank lines are skipped; malformed lines (no
+   'speaker:' prefix) are skipped and reported through on_error.
+
+   Usage:
+      from parsing import iter_file_turns
+      for turn in iter_file_turns('transcript.txt'):
+          print(turn.speaker, turn.message)
+"""
+
+import io
+import mmap
+from typing import NamedTuple
+
+import perf
+
+
+class Turn(NamedTuple):
+    '''One message of a conversation.'''
+    index: int      # position among the valid messages
+    line_no: int    # 1-based line number in the transcript
+    speaker: str
+    message: str
+
+
+def report_malformed(line_no, line):
+    '''Default on_error: prints the malformed line.'''
+    print(f"Skipping malformed line {line_no}: {line[:80]!r}")
+
+
+def iter_turns(lines, on_error=report_malformed):
+    '''Yields a Turn for every 'speaker: message' line of lines (any
+    iterable of strings). on_error(line_no, line) is called for malformed
+    lines; pass None to skip them silently.'''
+    index = 0
+    for line_no, line in enumerate(lines, start=1):
+        line = line.rstrip('\r\n')
+        if not line.strip():
+            continue
+        speaker, sep, message = line.partition(':')
+        speaker = speaker.strip()
+        if not sep or not speaker:
+            perf.count("malformed_lines")
+            if on_error is not None:
+                on_error(line_no, line)
+            continue
+        yield Turn(index, line_no, speaker, message)
+        index += 1
+
+
+def iter_conversation_turns(conversation, on_error=report_malformed):
+    '''Yields the Turns of a conversation held in a string.'''
+    return iter_turns(io.StringIO(conversation), on_error=on_error)
+
+
+def _iter_mapped_lines(file_path, encoding):
+    with open(file_path, 'rb') as file:
+        try:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # an empty file cannot be mapped
+            return
+        with mapped:
+            for line in iter(mapped.readline, b''):
+                yield line.decode(encoding, errors='replace')
+
+
+def iter_file_turns(file_path, on_error=report_malformed, encoding='utf-8'):
+    '''Yields the Turns of a transcript file, reading it line by line
+    from a memory map.'''
+    return iter_turns(_iter_mapped_lines(file_path, encoding), on_error=on_error)
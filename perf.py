@@ -0,0 +1,164 @@
+"""
+Author: Sobhan
+Date: 17-10-2026
+Project: Bones Ltd. job technical challenge.
+File: perf.py
+Description and Usage:
+   Light instrumentation of the pipeline stages (model loading, loading
+   the conversation, sentiment, filler ratio, emotions, tagging, charts).
+   Every stage is timed and counted; the totals are shown in the
+   "Performance" panel of the app and every stage is also written as a
+   JSON log line (logger 'perf') for monitoring, as are the events
+   reported with event(). With profiling on, each outermost stage also
+   runs under cProfile and keeps its top functions.
+   When turned off (the default), stage() is a shared no-op context.
+
+   Usage:
+      import perf
+      perf.configure(config['DEFAULT'])
+      with perf.stage("sentiment", messages=len(messages)):
+          ...
+"""
+
+import contextlib
+import cProfile
+import io
+import json
+import logging
+import pstats
+import threading
+import time
+
+logger = logging.getLogger('perf')
+
+_enabled = False
+_profile = False
+_stats = {}
+_counters = {}
+_profiles = {}
+# the stage being profiled (one at a time)
+_profiling = None
+_lock = threading.Lock()
+_noop = contextlib.nullcontext()
+
+
+def configure(section):
+    '''Turns instrumentation on/off from a config.ini section (perf_enabled,
+    perf_profile and perf_log_file, empty for stderr).'''
+    global _enabled, _profile
+    _enabled = str(section.get('perf_enabled', 'false')).lower() in ('1', 'true', 'yes', 'on')
+    _profile = str(section.get('perf_profile', 'false')).lower() in ('1', 'true', 'yes', 'on')
+    if _enabled and not logger.handlers:
+        log_file = section.get('perf_log_file', '')
+        handler = logging.FileHandler(log_file) if log_file else logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+
+def is_enabled():
+    return _enabled
+
+
+class _Stage:
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+        self.profiler = None
+
+    def __enter__(self):
+        global _profiling
+        if _profile:
+            # only the outermost stage is profiled: a nested stage's
+            # profiler would replace the outer one (Python 3.11) or fail
+            # to start (3.12+); its functions show up in the outer report
+            with _lock:
+                if _profiling is None:
+                    _profiling = self
+                    self.profiler = cProfile.Profile()
+            if self.profiler is not None:
+                try:
+                    self.profiler.enable()
+                except ValueError:
+                    # a profiler from outside perf is running
+                    self._stop_profiling()
+        self.start = time.perf_counter()
+        return self
+
+    def _stop_profiling(self):
+        global _profiling
+        with _lock:
+            _profiling = None
+        self.profiler = None
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        if self.profiler is not None:
+            self.profiler.disable()
+            out = io.StringIO()
+            pstats.Stats(self.profiler, stream=out).sort_stats('cumulative').print_stats(15)
+            self._stop_profiling()
+            with _lock:
+                _profiles[self.name] = out.getvalue()
+        with _lock:
+            s = _stats.setdefault(self.name, {"calls": 0, "total_s": 0.0, "max_s": 0.0, "last_s": 0.0})
+            s["calls"] += 1
+            s["total_s"] += seconds
+            s["max_s"] = max(s["max_s"], seconds)
+            s["last_s"] = seconds
+        logger.info(json.dumps({"event": "stage", "stage": self.name,
+                                "seconds": round(seconds, 6), "ok": exc_type is None,
+                                "time": time.time(), **self.fields}))
+        return False
+
+
+def stage(name, **fields):
+    '''Context manager timing the stage `name`; extra fields (e.g. the
+    number of messages) go to its JSON log line.'''
+    if not _enabled:
+        return _noop
+    return _Stage(name, fields)
+
+
+def event(name, **fields):
+    '''Writes the event `name` (e.g. a retry, or the throughput of a run)
+    with its fields as a JSON log line.'''
+    if not _enabled:
+        return
+    logger.info(json.dumps({"event": name, "time": time.time(), **fields}))
+
+
+def count(name, n=1):
+    '''Adds n to the counter `name`.'''
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def summary():
+    '''Returns the per-stage stats as a list of dicts (slowest first).'''
+    with _lock:
+        rows = [{"stage": name, **s, "mean_s": s["total_s"] / s["calls"]}
+                for name, s in _stats.items()]
+    return sorted(rows, key=lambda row: row["total_s"], reverse=True)
+
+
+def counters():
+    with _lock:
+        return dict(_counters)
+
+
+def profiles():
+    '''Returns {stage: cProfile report} of the last run of every stage.'''
+    with _lock:
+        return dict(_profiles)
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+        _counters.clear()
+        _profiles.clear()
@@ -0,0 +1,124 @@
+"""
+Author: Sobhan
+Date: 17-10-2026
+Project: Bones Ltd. job technical challenge.
+File: pipeline.py
+Description and Usage:
+   Incremental recomputation of the analysis of a conversation.
+   The analysis is a small dependency graph:
+      parse -> sentiment
+      parse -> filler_ratio
+      parse -> emotion        (once emotions were asked for)
+   Every node keeps the fingerprint of its inputs (the transcript text,
+   the sentiment model and backend, the filler list and mode, the
+   text2emotion version) together with those of the nodes it depends on.
+   update() only recomputes the nodes whose fingerprint changed, e.g.
+   editing the filler list recomputes the filler ratios but keeps the
+   sentiments. A recomputed node still only sends the messages missing
+   from the result cache to the models (see cache.py).
+
+   Usage:
+      from pipeline import IncrementalAnalysis
+      analysis = IncrementalAnalysis()
+      results = analysis.update(conversation, filler_words)
+      results = analysis.update(conversation, new_filler_words)
+      analysis.recomputed      # ['filler_ratio']
+"""
+
+import hashlib
+
+from analysis import (compute_emotions, compute_filler_ratios, compute_sentiments,
+                      emotion_fingerprint, filler_fingerprint, sentiment_fingerprint,
+                      EMOTION_COLS)
+from parsing import iter_conversation_turns
+from results import ResultTable
+
+# node -> the nodes it depends on
+NODES = {
+    'parse': (),
+    'sentiment': ('parse',),
+    'filler_ratio': ('parse',),
+    'emotion': ('parse',),
+}
+
+
+def _chunked(func, messages, chunk_size=1024):
+    '''Returns func(messages), calling it chunk_size messages at a time.'''
+    out = []
+    for start in range(0, len(messages), chunk_size):
+        out.extend(func(messages[start:start + chunk_size]))
+    return out
+
+
+class IncrementalAnalysis:
+    '''The analysis of one conversation, kept per node so that a change of
+    an input only recomputes the nodes depending on it.
+    results is the ResultTable of the last update and recomputed the
+    nodes that update had to compute again.'''
+
+    def __init__(self):
+        self.fingerprints = {}
+        self.outputs = {}
+        self.recomputed = []
+        self.results = ResultTable.empty()
+        self.emotions = False
+
+    def _run(self, node, inputs, compute):
+        '''Recomputes node if its inputs or an upstream node changed.'''
+        upstream = tuple(self.fingerprints[dep] for dep in NODES[node])
+        fingerprint = hashlib.sha1(repr((inputs, upstream)).encode('utf-8')).hexdigest()
+        if self.fingerprints.get(node) != fingerprint:
+            self.outputs[node] = compute()
+            self.fingerprints[node] = fingerprint
+            self.recomputed.append(node)
+
+    def update(self, conversation, filler_words, batch_size=32, filler_mode='spacy',
+               emotion_workers=None, progress=None):
+        '''Brings the results up to date with the given conversation,
+        filler list and the configured models, and returns them.
+        emotion_workers and progress go to compute_emotions.'''
+        self.recomputed = []
+        text_hash = hashlib.sha1(conversation.encode('utf-8')).hexdigest()
+
+        def parse():
+            turns = list(iter_conversation_turns(conversation))
+            return [turn.speaker for turn in turns], [turn.message for turn in turns]
+        self._run('parse', text_hash, parse)
+        messages = self.outputs['parse'][1]
+
+        self._run('sentiment', sentiment_fingerprint(), lambda: _chunked(
+            lambda msgs: compute_sentiments(msgs, batch_size=batch_size), messages))
+        self._run('filler_ratio', filler_fingerprint(filler_words, filler_mode), lambda: _chunked(
+            lambda msgs: compute_filler_ratios(msgs, filler_words, filler_mode), messages))
+        if self.emotions:
+            self._update_emotions(emotion_workers, progress)
+
+        if self.recomputed:
+            self.results = self._assemble()
+        return self.results
+
+    def _update_emotions(self, workers, progress):
+        self._run('emotion', emotion_fingerprint(), lambda: compute_emotions(
+            self.outputs['parse'][1], workers=workers, progress=progress))
+
+    def add_emotions(self, workers=None, progress=None):
+        '''Adds the emotion node (kept up to date by later updates) and
+        returns the results with the emotion columns.'''
+        self.emotions = True
+        self.recomputed = []
+        self._update_emotions(workers, progress)
+        if self.recomputed:
+            self.results = self._assemble()
+        return self.results
+
+    def _assemble(self):
+        speakers, messages = self.outputs['parse']
+        sentiments = self.outputs['sentiment']
+        results = ResultTable.from_columns(speakers, messages,
+                                           [sentiment['label'] for sentiment in sentiments],
+                                           [sentiment['score'] for sentiment in sentiments],
+                                           self.outputs['filler_ratio'])
+        if self.emotions:
+            results = results.with_columns({col: [e.get(col, 0.0) for e in self.outputs['emotion']]
+                                            for col in EMOTION_COLS})
+        return results
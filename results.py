@@ -0,0 +1,161 @@
+"""
+Author: Sobhan
+Date: 17-10-2026
+Project: Bones Ltd. job technical challenge.
+File: results.py
+Description and Usage:
+   A compact columnar store for the per-message analysis results, in
+   place of a list of dicts (one dict, with its keys and a copy of the
+   speaker and label strings, per message).
+   The results are held as an Arrow table: the messages in one string
+   buffer, speaker and sentiment label as dictionary (categorical) codes
+   and the scores as float arrays. It converts to pandas without copying
+   the numbers (speaker and label become Categorical columns) and is
+   written to / memory-mapped from disk as an Arrow IPC file.
+   A table is never changed in place: appending results or columns
+   returns a new table that shares the existing buffers.
+
+   Usage:
+      from results import ResultTable
+      table = ResultTable.from_records([{'speaker': 'Speaker A', ...}])
+      df = table.to_pandas()
+      table.save('results.arrow'); table = ResultTable.load('results.arrow')
+"""
+
+import hashlib
+
+import pyarrow as pa
+
+# columns every result table has; emotion columns may be added after
+COLUMNS = ['speaker', 'message', 'sentiment', 'score', 'filler_words_ratio']
+
+
+def _schema():
+    return pa.schema([('speaker', pa.dictionary(pa.int32(), pa.string())),
+                      ('message', pa.string()),
+                      ('sentiment', pa.dictionary(pa.int32(), pa.string())),
+                      ('score', pa.float64()),
+                      ('filler_words_ratio', pa.float64())])
+
+
+class ResultTable:
+    '''The analysis results of a conversation, one row per message.
+    Iterating it (or indexing it with a row number) still gives the
+    result dicts, for code written for the list of dicts.'''
+
+    def __init__(self, table):
+        self.table = table
+        self._hash = None
+
+    @classmethod
+    def empty(cls):
+        return cls(_schema().empty_table())
+
+    @classmethod
+    def from_columns(cls, speakers, messages, sentiments, scores, filler_words_ratios):
+        '''Builds a table from one sequence per column.'''
+        return cls(pa.table([pa.array(speakers, pa.string()).dictionary_encode(),
+                             pa.array(messages, pa.string()),
+                             pa.array(sentiments, pa.string()).dictionary_encode(),
+                             pa.array(scores, pa.float64()),
+                             pa.array(filler_words_ratios, pa.float64())],
+                            schema=_schema()))
+
+    @classmethod
+    def from_records(cls, records):
+        '''Builds a table from result dicts. Keys besides COLUMNS (e.g.
+        emotion scores) become float columns.'''
+        records = list(records)
+        if not records:
+            return cls.empty()
+        table = cls.from_columns(*([entry[col] for entry in records] for col in COLUMNS))
+        extra = [key for key in records[0] if key not in COLUMNS]
+        return table.with_columns({key: [entry[key] for entry in records] for key in extra})
+
+    @classmethod
+    def concat(cls, tables):
+        '''Returns the rows of all tables, in order (buffers are shared).'''
+        tables = [t.table for t in tables if len(t)]
+        if not tables:
+            return cls.empty()
+        return cls(pa.concat_tables(tables).unify_dictionaries())
+
+    def append(self, other):
+        '''Returns a new table with the rows of other after these.'''
+        return ResultTable.concat([self, other])
+
+    def with_columns(self, columns):
+        '''Returns a new table with the given float columns ({name: values})
+        added (or replaced).'''
+        table = self.table
+        for name, values in columns.items():
+            array = pa.array(values, pa.float64())
+            if name in table.column_names:
+                table = table.set_column(table.column_names.index(name), name, array)
+            else:
+                table = table.append_column(name, array)
+        return ResultTable(table)
+
+    @property
+    def column_names(self):
+        return self.table.column_names
+
+    @property
+    def nbytes(self):
+        return self.table.nbytes
+
+    def column(self, name):
+        '''Returns a column as a Python list.'''
+        return self.table.column(name).to_pylist()
+
+    def messages(self):
+        return self.column('message')
+
+    def to_pandas(self):
+        '''Returns the results as a DataFrame. Numbers are not copied,
+        speaker and sentiment are Categorical columns.'''
+        return self.table.to_pandas(split_blocks=True)
+
+    def content_hash(self):
+        '''Returns a hash of the content (computed once per table).'''
+        if self._hash is None:
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, self.table.schema) as writer:
+                writer.write_table(self.table)
+            self._hash = hashlib.sha1(sink.getvalue()).hexdigest()
+        return self._hash
+
+    def save(self, path):
+        '''Writes the table to path as an Arrow IPC file.'''
+        with pa.OSFile(path, 'wb') as sink:
+            with pa.ipc.new_file(sink, self.table.schema) as writer:
+                writer.write_table(self.table)
+
+    @classmethod
+    def load(cls, path):
+        '''Reads a table written by save(); the file is memory-mapped, so
+        its buffers are not copied into memory.'''
+        # the map stays open as long as the table uses its buffers
+        return cls(pa.ipc.open_file(pa.memory_map(path, 'r')).read_all())
+
+    def __len__(self):
+        return self.table.num_rows
+
+    def __iter__(self):
+        for batch in self.table.to_batches():
+            yield from batch.to_pylist()
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("result index out of range")
+        return self.table.slice(index, 1).to_pylist()[0]
+
+
+def as_result_table(results):
+    '''Returns results (a ResultTable or a list of result dicts) as a
+    ResultTable.'''
+    if isinstance(results, ResultTable):
+        return results
+    return ResultTable.from_records(results)
@@ -0,0 +1,138 @@
+"""
+Author: Sobhan
+Date: 17-10-2026
+Project: Bones Ltd. job technical challenge.
+File: tagging.py
+Description and Usage:
+   Tags a conversation with TagOutput (see tags.py) using an LLM.
+   Long conversations don't fit in the context window of the model, so
+   the messages are split in windows which are tagged concurrently
+   (at most `concurrency` requests at a time). The tags of all windows are
+   then reduced into one TagOutput. Failed requests are retried with a
+   capped exponential backoff, and the tags of every window are kept in
+   the result cache (see cache.py), or in memory if it is turned off.
+
+   Usage:
+      from tagging import tag_conversation
+      tags = tag_conversation(messages)                # Groq model
+      tags = tag_conversation(messages, llm=FakeTaggingLLM(tags=...))
+"""
+
+import asyncio
+import random
+import typing
+from collections import Counter
+
+from langchain.chains import create_tagging_chain_pydantic
+
+import cache
+import perf
+from models import get_model, registry
+from tags import TagOutput
+
+# window tags kept in memory when the result cache is turned off
+_memory_cache = {}
+
+
+def split_windows(messages, max_chars=6000):
+    '''Splits messages in windows of at most max_chars characters (about
+    1500 tokens). Messages are never cut, a longer one is its own window.'''
+    windows, current, size = [], [], 0
+    for msg in messages:
+        msg = str(msg).strip()
+        if current and size + len(msg) + 1 > max_chars:
+            windows.append(' '.join(current))
+            current, size = [], 0
+        current.append(msg)
+        size += len(msg) + 1
+    if current:
+        windows.append(' '.join(current))
+    return windows
+
+
+def reduce_tags(window_tags, weights=None):
+    '''Reduces the TagOutput of every window into one.
+    Scale fields (e.g. 'low' ... 'very high') get the weighted mean
+    position on their scale, free text fields the most common value
+    ('context' keeps the distinct ones).'''
+    weights = weights or [1] * len(window_tags)
+    reduced = {}
+    hints = typing.get_type_hints(TagOutput)
+    # pydantic v2 has model_fields, v1 __fields__
+    fields = getattr(TagOutput, 'model_fields', None) or TagOutput.__fields__
+    for name in fields:
+        annotation = hints[name]
+        values = [getattr(tags, name) for tags in window_tags]
+        if typing.get_origin(annotation) is typing.Literal:
+            scale = typing.get_args(annotation)
+            mean = sum(scale.index(v) * w for v, w in zip(values, weights)) / sum(weights)
+            reduced[name] = scale[round(mean)]
+        elif name == 'context':
+            reduced[name] = '; '.join(dict.fromkeys(values))
+        else:
+            reduced[name] = Counter(values).most_common(1)[0][0]
+    return TagOutput(**reduced)
+
+
+async def _tag_window(chain, text, semaphore, max_retries, base_delay, max_delay):
+    async with semaphore:
+        for attempt in range(max_retries + 1):
+            try:
+                result = await chain.ainvoke({"input": text})
+                return result["text"]
+            except Exception as e:
+                if attempt == max_retries:
+                    raise
+                # capped exponential backoff with jitter
+                delay = min(max_delay, base_delay * 2 ** attempt) * random.uniform(0.5, 1)
+                perf.event("retry", stage="tagging", attempt=attempt + 1,
+                           delay_s=round(delay, 3), error=str(e))
+                await asyncio.sleep(delay)
+
+
+async def tag_windows(windows, llm, concurrency=4, max_retries=5,
+                      base_delay=1.0, max_delay=30.0):
+    '''Tags every window concurrently and returns their TagOutputs in order.'''
+    chain = create_tagging_chain_pydantic(TagOutput, llm)
+    semaphore = asyncio.Semaphore(concurrency)
+    return await asyncio.gather(*(
+        _tag_window(chain, text, semaphore, max_retries, base_delay, max_delay)
+        for text in windows))
+
+
+def tag_conversation(messages, llm=None, model_id=None, max_chars=6000,
+                     concurrency=4, max_retries=5, base_delay=1.0, max_delay=30.0):
+    '''Tags the messages of a conversation and returns one TagOutput.
+    llm defaults to the shared Groq model; model_id identifies the model in
+    the result cache (its name by default).'''
+    if llm is None:
+        llm = get_model("groq")
+        model_id = model_id or registry.spec("groq")[0]
+    model_id = model_id or type(llm).__name__
+
+    windows = split_windows(messages, max_chars=max_chars)
+    if not windows:
+        raise ValueError("Cannot tag an empty conversation.")
+
+    result_cache = cache.get_cache()
+    keys = [cache.cache_key("tags", model_id, text) for text in windows]
+    if result_cache is not None:
+        found = result_cache.get_many(keys)
+    else:
+        found = {key: _memory_cache[key] for key in keys if key in _memory_cache}
+    missing = [i for i, key in enumerate(keys) if key not in found]
+    if missing:
+        perf.count("tagging_windows", len(missing))
+        with perf.stage("tagging", windows=len(missing)):
+            tagged = asyncio.run(tag_windows([windows[i] for i in missing], llm,
+                                             concurrency=concurrency, max_retries=max_retries,
+                                             base_delay=base_delay, max_delay=max_delay))
+        new = {keys[i]: tags.dict() for i, tags in zip(missing, tagged)}
+        if result_cache is not None:
+            result_cache.put_many(new.items())
+        else:
+            _memory_cache.update(new)
+        found.update(new)
+
+    window_tags = [TagOutput(**found[key]) for key in keys]
+    return reduce_tags(window_tags, weights=[len(text) for text in windows])
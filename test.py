@@ -7,10 +7,35 @@ Description and Usage:
     unit test file. Just run >> python3 test.py
 """
 
+import os
+import re
+import tempfile
+import time
 import unittest
 from utils import (read_fillers_from_file,
                    gen_auto_sample_conversation,
-                   load_conversation)
+                   load_conversation,
+                   TranscriptFollower,
+                   render_chart,
+                   select_conversation_page)
+import models
+from models import ModelRegistry
+from cache import ResultCache
+from analytics import get_analytics, lttb, AnalyticsFrame
+from results import ResultTable
+from pipeline import IncrementalAnalysis
+from fake_llm import FakeTaggingLLM, FakeConversationLLM
+from generate import generate_corpus, validate_conversation
+from tagging import tag_conversation, split_windows, reduce_tags
+from tags import TagOutput
+from benchmark import (generate_transcript, measure_startup,
+                       STARTUP_BUDGET_S)
+import perf
+import inference
+from parsing import iter_conversation_turns, iter_file_turns, Turn
+from parity import run_parity
+from aggregate import AggregateStore, part_partials
+from analysis import batched_sentiment, compute_filler_ratio, compute_sentiment, FillerMatcher
 
 
 class TestMyModule(unittest.TestCase):
@@ -48,5 +73,1007 @@ class TestMyModule(unittest.TestCase):
         self.assertNotIn("Error", conversation)
 
 
+class TestModelRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+
+        def loader(name, version=None, **config):
+            self.calls.append((name, version))
+            return object()
+
+        self.loader = loader
+        self.registry = ModelRegistry()
+
+    def test_loads_once(self):
+        self.registry.register("m", self.loader, "a", version="1")
+        self.assertIs(self.registry.get("m"), self.registry.get("m"))
+        self.assertEqual(len(self.calls), 1)
+
+    def test_reloads_on_spec_change(self):
+        self.registry.register("m", self.loader, "a", version="1")
+        first = self.registry.get("m")
+        self.registry.register("m", self.loader, "a", version="1")
+        self.assertIs(self.registry.get("m"), first)
+        self.registry.register("m", self.loader, "a", version="2")
+        self.assertIsNot(self.registry.get("m"), first)
+        self.assertEqual(self.calls, [("a", "1"), ("a", "2")])
+
+    def test_warm_up(self):
+        self.registry.register("m", self.loader, "a")
+        self.assertFalse(self.registry.is_loaded("m"))
+        self.registry.warm_up()
+        self.assertTrue(self.registry.is_loaded("m"))
+
+    def test_onnx_export_is_made_once(self):
+        import sys
+        import types
+        from unittest import mock
+        exports = []
+
+        class FakeORTModel:
+            @classmethod
+            def from_pretrained(cls, name, revision=None, export=False):
+                exports.append((name, revision, export))
+                return cls()
+
+            def save_pretrained(self, path):
+                with open(os.path.join(path, 'model.onnx'), 'wb') as f:
+                    f.write(b'onnx')
+
+        fake = types.ModuleType('optimum.onnxruntime')
+        fake.ORTModelForSequenceClassification = FakeORTModel
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch.dict(sys.modules, {'optimum': types.ModuleType('optimum'),
+                                              'optimum.onnxruntime': fake}):
+            path = models._onnx_export("org/model", "abc", tmp)
+            self.assertEqual(models._onnx_export("org/model", "abc", tmp), path)
+            self.assertEqual(exports, [("org/model", "abc", True)])
+            self.assertEqual(os.listdir(tmp), [os.path.basename(path)])
+
+    def test_warm_up_in_background(self):
+        import threading
+        release = threading.Event()
+        self.registry.register("slow", lambda name, version=None: release.wait(5), "slow")
+        thread = self.registry.warm_up(["slow"], background=True)
+        # returns at once, and a second call does not start another load
+        self.assertFalse(self.registry.is_loaded("slow"))
+        self.assertIsNone(self.registry.warm_up(["slow"], background=True))
+        # registering the same spec again (a rerun) keeps the load going
+        self.registry.register("slow", self.registry._specs["slow"][0], "slow")
+        release.set()
+        thread.join(5)
+        self.assertTrue(self.registry.is_loaded("slow"))
+
+    def test_loading_does_not_block_other_keys(self):
+        import threading
+        release = threading.Event()
+        self.registry.register("slow", lambda name, version=None: release.wait(5), "slow")
+        self.registry.register("m", self.loader, "a")
+        self.registry.get("m")
+        loading = threading.Thread(target=self.registry.get, args=("slow",))
+        loading.start()
+        time.sleep(0.05)
+        start = time.perf_counter()
+        self.registry.register("other", self.loader, "b")
+        self.registry.get("other")
+        self.assertLess(time.perf_counter() - start, 1)
+        release.set()
+        loading.join()
+        self.assertTrue(self.registry.is_loaded("slow"))
+
+    def test_using_serializes_a_model(self):
+        import threading
+        self.registry.register("m", self.loader, "a")
+        active, most_active = [], []
+
+        def use():
+            with self.registry.using("m"):
+                active.append(1)
+                most_active.append(len(active))
+                time.sleep(0.01)
+                active.pop()
+        threads = [threading.Thread(target=use) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(max(most_active), 1)
+        self.assertEqual(len(self.calls), 1)
+
+
+class TestBatchedSentiment(unittest.TestCase):
+
+    def test_keeps_original_order(self):
+        batches = []
+
+        def fake_pipeline(msgs, batch_size=None, truncation=None):
+            batches.append(list(msgs))
+            return [{'label': 'POSITIVE', 'score': len(m)} for m in msgs]
+
+        messages = ["a b c d", "a", "a b c", "a b", "a b c d e"]
+        result = batched_sentiment(fake_pipeline, messages, batch_size=2)
+        self.assertEqual([r['score'] for r in result], [len(m) for m in messages])
+        # batches are bucketed by length
+        self.assertEqual(batches[0], ["a", "a b"])
+        self.assertEqual(len(batches), 3)
+
+
+class TestParity(unittest.TestCase):
+
+    def test_reports_agreement_and_drift(self):
+        def loader(name, version=None, backend='pytorch', threads=0):
+            # the candidate flips the label of 'meh' and moves every score
+            shift = 0.0 if backend == 'pytorch' else 0.05
+            def pipeline(msgs, batch_size=None, truncation=None):
+                return [{'label': 'NEGATIVE' if m == 'meh' and shift else 'POSITIVE',
+                         'score': 0.9 - shift} for m in msgs]
+            return pipeline
+
+        report = run_parity(['good', 'great', 'fine', 'meh'], 'quantized', loader=loader)
+        self.assertEqual(report['agreement'], 0.75)
+        self.assertAlmostEqual(report['mean_drift'], (3 * 0.05 + 1.75) / 4)
+        self.assertAlmostEqual(report['max_drift'], 1.75)
+
+
+class TestIncrementalAnalysis(unittest.TestCase):
+
+    conversation = "Speaker A: um hello there\nSpeaker B: well hi\n"
+
+    def setUp(self):
+        import cache
+        cache.configure({})
+        self.spec = models.registry._specs["sentiment"]
+        self.calls = []
+
+        def loader(name, version=None, **config):
+            def pipeline(msgs, batch_size=None, truncation=None):
+                self.calls.append(list(msgs))
+                return [{'label': 'POSITIVE', 'score': 0.9} for _ in msgs]
+            return pipeline
+        self.loader = loader
+        models.registry.register("sentiment", loader, "fake", version="1")
+
+    def tearDown(self):
+        loader, name, version, config = self.spec
+        models.registry.register("sentiment", loader, name, version, **config)
+
+    def test_only_changed_nodes_are_recomputed(self):
+        analysis = IncrementalAnalysis()
+        results = analysis.update(self.conversation, ['um'], filler_mode='fast')
+        self.assertEqual(analysis.recomputed, ['parse', 'sentiment', 'filler_ratio'])
+        self.assertEqual(results.column('filler_words_ratio'), [1 / 3, 0.0])
+
+        self.assertIs(analysis.update(self.conversation, ['um'], filler_mode='fast'), results)
+        self.assertEqual(analysis.recomputed, [])
+
+        results = analysis.update(self.conversation, ['um', 'well'], filler_mode='fast')
+        self.assertEqual(analysis.recomputed, ['filler_ratio'])
+        self.assertEqual(results.column('filler_words_ratio'), [1 / 3, 0.5])
+        self.assertEqual(len(self.calls), 1)
+
+        models.registry.register("sentiment", self.loader, "fake", version="2")
+        analysis.update(self.conversation, ['um', 'well'], filler_mode='fast')
+        self.assertEqual(analysis.recomputed, ['sentiment'])
+
+        analysis.update(self.conversation + "Speaker A: bye\n", ['um', 'well'], filler_mode='fast')
+        self.assertEqual(analysis.recomputed, ['parse', 'sentiment', 'filler_ratio'])
+
+
+class TestFillerMatcher(unittest.TestCase):
+
+    @staticmethod
+    def regex_filler_count(text, filler_words):
+        # the per-phrase regex scan that FillerMatcher replaces
+        count = 0
+        for phrase in filler_words:
+            pattern = r'\b' + re.escape(phrase.lower()) + r'\b'
+            count += len(re.findall(pattern, text.lower()))
+        return count
+
+    def test_matches_regex_counts(self):
+        fillers = read_fillers_from_file('filler_words.txt')
+        matcher = FillerMatcher(fillers)
+        texts = [line.split(':', 1)[1] for line in open('transcript.txt') if ':' in line]
+        texts += ["you know you know what I mean",
+                  "uh-huh, like, I  mean, I mean... likely unlike",
+                  "really really really"]
+        for text in texts:
+            self.assertEqual(matcher.count(text)[0],
+                             self.regex_filler_count(text, fillers), msg=text)
+
+    def test_fast_mode_parity_with_spacy(self):
+        try:
+            import spacy
+        except ImportError:
+            self.skipTest("spaCy is not installed")
+        # the word count only relies on spaCy's tokenizer, which is the
+        # same for a blank English pipeline and en_core_web_sm
+        models.registry.register("spacy", lambda name, version=None: spacy.blank("en"), "blank_en")
+        try:
+            fillers = read_fillers_from_file('filler_words.txt')
+            messages = [line.split(':', 1)[1] for line in open('transcript.txt')]
+            # the tokenizer rules the fast word count follows
+            messages += ["I'm gonna, like, call at 3pm", "gonna gotta wanna cannot",
+                         "um 3pm 10am 13pm 5km 2nd 4x abc123",
+                         "so mail john.doe@example.com or see https://example.com/a-b or www.x.org",
+                         "you know, e.g. the U.S. thing, i.e. @support",
+                         "don't can't y'all ma'am o'clock it'll've rock'n'roll bob's dogs'",
+                         "im dont thats youre cant wont, like, well-known uh-huh",
+                         "well it's 5:30 and $20, 3.5 percent"]
+            for msg in messages:
+                self.assertAlmostEqual(
+                    compute_filler_ratio(msg, fillers, mode='fast'),
+                    compute_filler_ratio(msg, fillers, mode='spacy'), msg=msg)
+        finally:
+            models.configure({})
+
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = ResultCache(os.path.join(self.tmp.name, 'cache.sqlite'), max_entries=2)
+
+    def tearDown(self):
+        self.cache._conn.close()
+        self.tmp.cleanup()
+
+    def test_only_misses_are_computed(self):
+        computed = []
+
+        def compute(missing):
+            computed.extend(missing)
+            return [{'value': i} for i in missing]
+
+        self.assertEqual(self.cache.cached(['a', 'b'], compute), [{'value': 0}, {'value': 1}])
+        self.assertEqual(self.cache.cached(['b', 'a'], compute), [{'value': 1}, {'value': 0}])
+        self.assertEqual(computed, [0, 1])
+        self.assertEqual(self.cache.stats()['hits'], 2)
+        self.assertEqual(self.cache.stats()['misses'], 2)
+
+    def test_lru_eviction(self):
+        self.cache.put_many([('a', 1), ('b', 2)])
+        self.cache.get_many(['a'])
+        self.cache.put_many([('c', 3)])
+        self.assertEqual(self.cache.get_many(['a', 'b', 'c']), {'a': 1, 'c': 3})
+
+    def test_entry_count_is_kept_without_counting(self):
+        self.cache.put_many([('a', 1), ('b', 2)])
+        # replacing an entry does not make room by evicting another one
+        self.cache.put_many([('a', 10), ('b', 20)])
+        self.assertEqual(self.cache.get_many(['a', 'b']), {'a': 10, 'b': 20})
+        self.cache.put_many([('c', 3), ('d', 4), ('d', 5)])
+        self.assertEqual(self.cache.stats()['entries'], 2)
+        self.assertEqual(self.cache.get_many(['a', 'b', 'c', 'd']), {'c': 3, 'd': 5})
+        reopened = ResultCache(self.cache.path, max_entries=2)
+        self.assertEqual(reopened.stats()['entries'], 2)
+        reopened._conn.close()
+
+
+def _fake_emotions_chunk(messages):
+    # module level, so that the spawned pool processes can unpickle it
+    return [{'Happy': float(len(msg)), 'Sad': 0.5} for msg in messages]
+
+
+class TestEmotions(unittest.TestCase):
+
+    def setUp(self):
+        import cache
+        self.tmp = tempfile.TemporaryDirectory()
+        cache.configure({'cache_file': os.path.join(self.tmp.name, 'cache.sqlite')})
+
+    def tearDown(self):
+        import cache
+        cache.get_cache()._conn.close()
+        cache.configure({})
+        self.tmp.cleanup()
+
+    def test_order_pool_and_cache_reuse(self):
+        import analysis
+        from unittest import mock
+        messages = [' ' * i for i in range(120)]
+        with mock.patch('analysis._emotions_chunk', _fake_emotions_chunk):
+            done = []
+            emotions = analysis.compute_emotions(messages, workers=2, chunk_size=25,
+                                                 progress=lambda n, total: done.append(n))
+            self.assertEqual([emotion['Happy'] for emotion in emotions], list(range(120)))
+            self.assertEqual(done, [25, 50, 75, 100, 120])
+            pool = analysis._get_pool(2)
+            self.assertEqual(pool._mp_context.get_start_method(), 'spawn')
+            # the pool is kept for the next call
+            analysis.compute_emotions(messages[:60] + ['new one'], workers=2, chunk_size=25)
+            self.assertIs(analysis._get_pool(2), pool)
+
+        computed = []
+
+        def emotions_chunk(chunk):
+            computed.extend(chunk)
+            return _fake_emotions_chunk(chunk)
+        results = ResultTable.from_records([
+            {'speaker': 'Speaker A', 'message': msg, 'sentiment': 'POSITIVE', 'score': 0.9,
+             'filler_words_ratio': 0.0} for msg in ['x', messages[7], 'new one', 'yz']])
+        with mock.patch('analysis._emotions_chunk', emotions_chunk):
+            results = analysis.add_emotions(results, workers=1)
+        # only the messages not seen before were computed
+        self.assertEqual(computed, ['x', 'yz'])
+        self.assertEqual(results.column('Happy'), [1.0, 7.0, 7.0, 2.0])
+        self.assertEqual(results.column('Fear'), [0.0] * 4)
+
+
+def _follow_app(transcript_file):
+    # the script of TestTranscriptFollower's AppTest
+    import app
+    app.follow(transcript_file, 'filler_words.txt', 3600, emotion_workers=1,
+               filler_mode='fast')
+
+
+class TestTranscriptFollower(unittest.TestCase):
+
+    def test_reads_only_new_complete_lines(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'live.txt')
+            with open(path, 'w') as f:
+                f.write("Speaker A: hi\nSpeaker B: hel")
+            follower = TranscriptFollower(path)
+            self.assertEqual(follower.read_new_lines(), "Speaker A: hi")
+            self.assertEqual(follower.read_new_lines(), "")
+            with open(path, 'a') as f:
+                f.write("lo\n\nSpeaker A: bye\n")
+            self.assertEqual(follower.read_new_lines(), "Speaker B: hello\nSpeaker A: bye")
+
+    def test_added_columns_are_extended_with_the_new_messages(self):
+        import cache
+        spec = models.registry._specs["sentiment"]
+        self.addCleanup(models.registry.register, "sentiment", spec[0], spec[1], spec[2], **spec[3])
+        models.registry.register("sentiment", _fake_sentiment_loader, "fake")
+        cache.configure({})
+        computed = []
+
+        def add_lengths(results, progress=None):
+            computed.append(len(results))
+            return results.with_columns({'length': [len(msg) for msg in results.messages()]})
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'live.txt')
+            with open(path, 'w') as f:
+                f.write("Speaker A: hi\nSpeaker B: um no\n")
+            follower = TranscriptFollower(path)
+            follower.update(['um'], filler_mode='fast')
+            results = follower.add_columns('length', add_lengths)
+            self.assertIs(follower.add_columns('length', add_lengths), results)
+            with open(path, 'a') as f:
+                f.write("Speaker A: hi again\n")
+            follower.update(['um'], filler_mode='fast')
+        # computed for the new message only
+        self.assertEqual(computed, [2, 1])
+        self.assertEqual(follower.results.column('length'), [3.0, 6.0, 9.0])
+        self.assertEqual(list(follower.analytics.df['length']), [3.0, 6.0, 9.0])
+        self.assertIs(get_analytics(follower.results), follower.analytics)
+
+    def test_follow_ticks_compute_emotions_of_new_messages_only(self):
+        import sys
+        import cache
+        from unittest import mock
+        from streamlit.testing.v1 import AppTest
+        spec = models.registry._specs["sentiment"]
+        self.addCleanup(models.registry.register, "sentiment", spec[0], spec[1], spec[2], **spec[3])
+        models.registry.register("sentiment", _fake_sentiment_loader, "fake")
+        cache.configure({})
+        self.enterContext(mock.patch.dict(sys.modules, {'__main__': sys.modules['__main__']}))
+        computed = []
+
+        def emotions_chunk(messages):
+            computed.append(len(messages))
+            return _fake_emotions_chunk(messages)
+        self.enterContext(mock.patch('analysis._emotions_chunk', emotions_chunk))
+        tmp = self.enterContext(tempfile.TemporaryDirectory())
+        path = os.path.join(tmp, 'live.txt')
+        with open(path, 'w') as f:
+            f.write("Speaker A: hi\nSpeaker B: um no\n" * 10)
+
+        at = AppTest.from_function(_follow_app, args=(path,), default_timeout=30).run()
+        at.selectbox[1].set_value("Emotion Breakdown per Speaker").run()
+        self.assertEqual(sum(computed), 20)
+        for tick in range(3):
+            with open(path, 'a') as f:
+                f.write("Speaker A: hi again\n")
+            at.run()
+        self.assertFalse(at.exception)
+        # every tick only computed the emotions of its new message
+        self.assertEqual(computed[-3:], [1, 1, 1])
+        self.assertEqual(sum(computed), 23)
+        follower = at.session_state.follower
+        self.assertEqual(len(follower.results), 23)
+        self.assertEqual(follower.results.column('Happy')[-1], float(len(' hi again')))
+        self.assertTrue(follower.analytics.has_emotions)
+        self.assertEqual(len(follower.analytics.df), 23)
+
+    def test_rewritten_or_replaced_file_starts_over(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'live.txt')
+            with open(path, 'w') as f:
+                f.write("Speaker A: hi\n")
+            follower = TranscriptFollower(path)
+            self.assertEqual(follower.read_new_lines(), "Speaker A: hi")
+            # rewritten in place, longer than before
+            with open(path, 'w') as f:
+                f.write("Speaker B: yes\nSpeaker A: ok\n")
+            self.assertEqual(follower.read_new_lines(), "Speaker B: yes\nSpeaker A: ok")
+            # rotated: replaced by another file of the same size
+            with open(path + '.new', 'w') as f:
+                f.write("Speaker C: no!\nSpeaker A: ok\n")
+            os.replace(path + '.new', path)
+            self.assertEqual(follower.read_new_lines(), "Speaker C: no!\nSpeaker A: ok")
+            with open(path, 'a') as f:
+                f.write("Speaker C: bye\n")
+            self.assertEqual(follower.read_new_lines(), "Speaker C: bye")
+
+
+class TestAnalyticsFrame(unittest.TestCase):
+
+    results = [
+        {'speaker': 'Speaker A', 'message': ' hi there', 'sentiment': 'POSITIVE', 'score': 0.9, 'filler_words_ratio': 0.1},
+        {'speaker': 'Speaker A', 'message': ' so', 'sentiment': 'NEGATIVE', 'score': 0.8, 'filler_words_ratio': 1.0},
+        {'speaker': 'Speaker B', 'message': ' well yes', 'sentiment': 'POSITIVE', 'score': 0.5, 'filler_words_ratio': 0.5},
+    ]
+
+    def test_derived_columns_and_aggregates(self):
+        frame = get_analytics(self.results)
+        self.assertEqual(list(frame.df['sentiment_score']), [0.9, -0.8, 0.5])
+        self.assertEqual(list(frame.df['turn']), [1, 1, 2])
+        self.assertEqual(list(frame.df['message_length']), [2, 1, 2])
+        self.assertAlmostEqual(frame.per_speaker.set_index('speaker').loc['Speaker A', 'sentiment_score'], 0.1)
+        self.assertEqual(list(frame.turn_counts['count']), [2, 1])
+
+    def test_cached_by_content(self):
+        self.assertIs(get_analytics(self.results), get_analytics(list(self.results)))
+
+    def test_extend_matches_a_full_build(self):
+        import pandas as pd
+        from analysis import EMOTION_COLS
+        from benchmark import synthetic_results
+        results = synthetic_results(generate_transcript(300, ['um']))
+        frame = AnalyticsFrame(results[:100])
+        # the chunks end within turns, and bring a new speaker
+        for start, stop in ((100, 101), (101, 250), (250, 250), (250, 300)):
+            frame = frame.extend(results[start:stop])
+        new_speaker = {'speaker': 'Speaker C', 'message': ' hello', 'sentiment': 'POSITIVE',
+                       'score': 0.7, 'filler_words_ratio': 0.0}
+        results.append(dict(new_speaker, **{col: 0.5 for col in EMOTION_COLS}))
+        frame = frame.extend(results[300:])
+        full = AnalyticsFrame(results)
+        pd.testing.assert_frame_equal(frame.df, full.df)
+        self.assertEqual(frame.speakers, full.speakers)
+        for name in ('per_speaker', 'sentiment_counts', 'turn_counts', 'turn_sentiment',
+                     'emotion_summary'):
+            pd.testing.assert_frame_equal(getattr(frame, name), getattr(full, name), check_dtype=False)
+        # without the emotions of the earlier results
+        with self.assertRaises(ValueError):
+            frame.extend([new_speaker])
+
+
+class TestResultTable(unittest.TestCase):
+
+    records = TestAnalyticsFrame.results
+
+    def test_round_trip_and_append(self):
+        table = ResultTable.from_records(self.records)
+        self.assertEqual(list(table), self.records)
+        self.assertEqual(table[-1], self.records[-1])
+        both = table.append(ResultTable.from_records(self.records[:1]))
+        self.assertEqual(len(both), 4)
+        self.assertEqual(both.column('speaker'), ['Speaker A', 'Speaker A', 'Speaker B', 'Speaker A'])
+        self.assertEqual(len(table), 3)
+
+    def test_pandas_handoff(self):
+        table = ResultTable.from_records(self.records)
+        df = table.to_pandas()
+        self.assertEqual(str(df['speaker'].dtype), 'category')
+        self.assertEqual(list(df['speaker'].cat.codes), [0, 0, 1])
+        # the scores are the Arrow buffer itself, not a copy
+        buffer = table.table.column('score').chunk(0).buffers()[1]
+        self.assertEqual(df['score'].to_numpy().__array_interface__['data'][0], buffer.address)
+
+    def test_save_and_load(self):
+        table = ResultTable.from_records(self.records).with_columns({'Happy': [0.1, 0.2, 0.3]})
+        path = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), 'results.arrow')
+        table.save(path)
+        loaded = ResultTable.load(path)
+        self.assertEqual(list(loaded), list(table))
+        self.assertEqual(loaded.content_hash(), table.content_hash())
+
+
+def _conversation_view_app():
+    # the script of TestConversationView's AppTest
+    from analytics import AnalyticsFrame
+    from benchmark import generate_transcript, synthetic_results
+    from utils import render_conversation
+    render_conversation(AnalyticsFrame(synthetic_results(generate_transcript(300, ['um']))))
+
+
+class TestConversationView(unittest.TestCase):
+
+    def setUp(self):
+        from benchmark import synthetic_results
+        self.df = AnalyticsFrame(synthetic_results(generate_transcript(300, ['um']))).df
+
+    def test_filters_and_pages(self):
+        rows, page, n_pages, page_rows = select_conversation_page(self.df, page_size=50, page=2)
+        self.assertEqual((len(rows), page, n_pages), (300, 2, 6))
+        self.assertEqual(list(page_rows), list(range(50, 100)))
+
+        speaker = self.df['speaker'].iloc[0]
+        rows, page, n_pages, page_rows = select_conversation_page(
+            self.df, speakers=[speaker], sentiments=['POSITIVE'], query='UM', page=99)
+        expected = self.df.index[(self.df['speaker'] == speaker) & (self.df['sentiment'] == 'POSITIVE')
+                                 & self.df['message'].str.lower().str.contains('um')]
+        self.assertEqual(list(rows), list(expected))
+        # clamped to the last page
+        self.assertEqual(page, n_pages)
+        self.assertEqual(list(page_rows), list(expected[(n_pages - 1) * 50:]))
+
+        rows, page, n_pages, page_rows = select_conversation_page(self.df, query='no such words')
+        self.assertEqual((len(rows), page, n_pages, len(page_rows)), (0, 1, 1, 0))
+
+    def test_jump_to_the_first_match_at_or_after(self):
+        speaker = self.df['speaker'].iloc[0]
+        rows, page, _, page_rows = select_conversation_page(
+            self.df, speakers=[speaker], page_size=25, page=1, jump=200)
+        first = rows[rows >= 200][0]
+        self.assertEqual(page, list(rows).index(first) // 25 + 1)
+        self.assertIn(first, page_rows)
+
+    def test_jump_again_and_page_reset(self):
+        import sys
+        from unittest import mock
+        from streamlit.testing.v1 import AppTest
+        # AppTest leaves its script as __main__, which processes spawned
+        # later (e.g. by other tests) would run
+        self.enterContext(mock.patch.dict(sys.modules, {'__main__': sys.modules['__main__']}))
+        at = AppTest.from_function(_conversation_view_app).run()
+        at.number_input(key='conversation_jump').set_value(120).run()
+        self.assertEqual(at.number_input(key='conversation_page').value, 3)
+        # the jump input is cleared once applied
+        self.assertIsNone(at.number_input(key='conversation_jump').value)
+        at.number_input(key='conversation_page').set_value(1).run()
+        at.number_input(key='conversation_jump').set_value(120).run()
+        self.assertEqual(at.number_input(key='conversation_page').value, 3)
+        # a new filter goes back to the first page
+        at.text_input[0].set_value('um').run()
+        self.assertEqual(at.number_input(key='conversation_page').value, 1)
+        self.assertFalse(at.exception)
+        self.assertFalse(at.warning)
+
+
+class TestCharts(unittest.TestCase):
+
+    def setUp(self):
+        from benchmark import synthetic_results
+        self.frame = AnalyticsFrame(synthetic_results(generate_transcript(5000, ['um'])))
+
+    def test_lttb_keeps_ends_and_peaks(self):
+        y = [0.0] * 1000
+        y[500] = 10.0
+        keep = lttb(range(1000), y, 50)
+        self.assertEqual(len(keep), 50)
+        self.assertEqual((keep[0], keep[-1]), (0, 999))
+        self.assertIn(500, keep)
+
+    def test_reduced_series_are_bounded(self):
+        self.assertLessEqual(len(self.frame.progression(500)), 500)
+        turns, size = self.frame.turn_buckets(self.frame.turn_counts, 'count', 50)
+        self.assertLessEqual(turns['turn'].nunique(), 50)
+        self.assertGreater(size, 1)
+        binned, _ = self.frame.score_histogram(bins=20)
+        self.assertEqual(binned['count'].sum(), len(self.frame.df))
+
+    def test_rendered_chart_is_cached(self):
+        option = "Sentiment Progression Over Time"
+        png = render_chart(option, self.frame, max_points=500)
+        self.assertTrue(png.startswith(b'\x89PNG'))
+        self.assertIs(render_chart(option, self.frame, max_points=500), png)
+
+
+class TestTagging(unittest.TestCase):
+
+    tags = dict(language='English', context='chat', formality='informal',
+                complexity='simple', coherence='coherent', verbosity='brief',
+                fluency='fluent', clarity='clear', repetition='low',
+                disfluency='moderate', sentiment='positive', politeness='polite',
+                empathy='moderate', aggressiveness='none', sarcasm='none',
+                humor='low', hostility='none', emotional_intensity='low')
+
+    def test_split_windows(self):
+        windows = split_windows(["a" * 4, "b" * 4, "c" * 4], max_chars=10)
+        self.assertEqual(windows, ["aaaa bbbb", "cccc"])
+
+    def test_windows_tagged_with_retries(self):
+        llm = FakeTaggingLLM(tags=self.tags, failures=2)
+        messages = [f"message number {i}" for i in range(40)]
+        result = tag_conversation(messages, llm=llm, model_id=f"fake-{id(self)}",
+                                  max_chars=100, base_delay=0.001)
+        self.assertEqual(result, TagOutput(**self.tags))
+        self.assertEqual(llm.calls, len(split_windows(messages, max_chars=100)) + 2)
+
+    def test_reduce_tags(self):
+        low = TagOutput(**{**self.tags, 'humor': 'none', 'context': 'work'})
+        high = TagOutput(**{**self.tags, 'humor': 'high'})
+        reduced = reduce_tags([low, high, high])
+        self.assertEqual(reduced.humor, 'moderate')
+        self.assertEqual(reduced.context, 'work; chat')
+
+
+class TestBenchmarkTranscript(unittest.TestCase):
+
+    def test_generated_transcript(self):
+        fillers = read_fillers_from_file('filler_words.txt')
+        transcript = generate_transcript(200, fillers, seed=1)
+        self.assertEqual(transcript, generate_transcript(200, fillers, seed=1))
+        lines = transcript.splitlines()
+        self.assertEqual(len(lines), 200)
+        for line in lines:
+            self.assertTrue(line.startswith("Speaker "), msg=line)
+        self.assertEqual(FillerMatcher([]).count(transcript)[0], 0)
+        self.assertGreater(FillerMatcher(fillers).count(transcript)[0], 0)
+
+
+class TestGenerateCorpus(unittest.TestCase):
+
+    def test_validate_conversation(self):
+        text = "Sure, here it is:\n\nSpeaker A: hi\nSpeaker B: hey\nSpeaker A: so\nSpeaker B: bye\n"
+        self.assertEqual(validate_conversation(text),
+                         "Speaker A: hi\nSpeaker B: hey\nSpeaker A: so\nSpeaker B: bye\n")
+        with self.assertRaises(ValueError):
+            validate_conversation("Speaker A: hi\nSpeaker A: so\nSpeaker A: well\nSpeaker A: ok")
+        with self.assertRaises(ValueError):
+            validate_conversation("Speaker A: hi\nSpeaker B: hey\nNarrator: and then\nSpeaker A: ok")
+
+    def test_retries_and_resume(self):
+        with tempfile.TemporaryDirectory() as corpus:
+            llm = FakeConversationLLM(failures=1, malformed=1)
+            stats = generate_corpus(corpus, 5, llm, concurrency=2, rate_limit=0,
+                                    retry_budget=2, base_delay=0.01)
+            self.assertEqual((stats['generated'], stats['errors'], stats['rejected']), (5, 1, 1))
+            self.assertEqual(len(os.listdir(corpus)), 5)
+            for name in os.listdir(corpus):
+                with open(os.path.join(corpus, name), encoding='utf-8') as f:
+                    validate_conversation(f.read())
+            stats = generate_corpus(corpus, 6, FakeConversationLLM(), rate_limit=0)
+            self.assertEqual(stats['generated'], 1)
+
+
+def _fake_sentiment_loader(name, version=None, **config):
+    return lambda msgs, batch_size=None, truncation=None: [
+        {'label': 'POSITIVE' if 'hi' in msg else 'NEGATIVE', 'score': 0.9} for msg in msgs]
+
+
+def _fake_batch_worker(config_file, filler_words_file):
+    # the batch workers' initializer, with a fake sentiment model and no cache
+    import batch
+    import cache
+    cache.configure({})
+    models.registry.register("sentiment", _fake_sentiment_loader, "fake")
+    batch._worker.update(filler_words=['um'], filler_mode='fast', batch_size=32)
+
+
+class TestBatch(unittest.TestCase):
+
+    def test_parts_resume_and_empty_transcripts(self):
+        import datetime
+        import pandas as pd
+        import pyarrow.parquet as pq
+        from unittest import mock
+        import batch
+        transcripts = self.enterContext(tempfile.TemporaryDirectory())
+        results_dir = self.enterContext(tempfile.TemporaryDirectory())
+        for name, text in [('a', "Speaker A: um hi\nSpeaker B: hello um\n"),
+                           ('b', "\nno colon here\nAgent: so um yes\n"),
+                           ('empty', "")]:
+            with open(os.path.join(transcripts, f"{name}.txt"), 'w') as f:
+                f.write(text)
+        # a transcript copied with its old modification time
+        os.utime(os.path.join(transcripts, 'a.txt'), (0, 0))
+
+        with mock.patch('batch._init_worker', _fake_batch_worker):
+            self.assertEqual(batch.run_batch(transcripts, results_dir, workers=2), [])
+            self.assertEqual(sorted(os.listdir(results_dir)),
+                             ['a.parquet', 'b.parquet', 'empty.parquet'])
+            # a part still being written (or left by a crash) is not read
+            with open(os.path.join(results_dir, '.c.parquet.tmp'), 'wb') as f:
+                f.write(b'PAR1 partial')
+            df = pd.read_parquet(results_dir)
+            self.assertEqual(list(df['transcript']), ['a.txt', 'a.txt', 'b.txt'])
+            # the line of each message in its transcript
+            self.assertEqual(list(df['line']), [1, 2, 3])
+            self.assertEqual(list(df['sentiment']), ['POSITIVE', 'NEGATIVE', 'NEGATIVE'])
+            self.assertEqual(list(df['filler_words_ratio']), [0.5, 0.5, 1 / 3])
+            # dated by the batch run
+            today = datetime.date.today()
+            self.assertEqual(set(df['date']), {today})
+            self.assertEqual(pq.read_schema(os.path.join(results_dir, 'a.parquet')).metadata[b'run_date'],
+                             today.isoformat().encode())
+            self.assertEqual(len(pd.read_parquet(os.path.join(results_dir, 'empty.parquet'))), 0)
+
+            # resuming only analyzes the transcripts without a part file
+            done = os.stat(os.path.join(results_dir, 'a.parquet')).st_mtime_ns
+            with open(os.path.join(transcripts, 'c.txt'), 'w') as f:
+                f.write("Speaker A: hi\n")
+            self.assertEqual(batch.run_batch(transcripts, results_dir, workers=2), [])
+            self.assertEqual(os.stat(os.path.join(results_dir, 'a.parquet')).st_mtime_ns, done)
+            self.assertEqual(len(pd.read_parquet(os.path.join(results_dir, 'c.parquet'))), 1)
+
+
+class TestAggregates(unittest.TestCase):
+
+    def write_part(self, results_dir, name, rows, date, run_date=None):
+        import datetime
+        import pandas as pd
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        df = pd.DataFrame(rows, columns=['speaker', 'message', 'sentiment', 'score',
+                                         'filler_words_ratio'])
+        df.insert(0, 'transcript', name)
+        df.insert(1, 'line', range(1, len(df) + 1))
+        df['date'] = datetime.date.fromisoformat(date)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if run_date:
+            table = table.replace_schema_metadata({**table.schema.metadata,
+                                                   b'run_date': run_date.encode()})
+        pq.write_table(table, os.path.join(results_dir, f"{name}.parquet"))
+
+    def test_incremental_update_and_metrics(self):
+        results_dir = self.enterContext(tempfile.TemporaryDirectory())
+        self.write_part(results_dir, 'a', [('A', 'um hi', 'POSITIVE', 0.8, 0.5),
+                                           ('A', 'hello there', 'NEGATIVE', 0.6, 0.0),
+                                           ('B', 'hi', 'POSITIVE', 0.9, 0.0)], '2026-10-01')
+        store = AggregateStore(results_dir)
+        self.assertEqual(store.update(), ['a.parquet'])
+        speaker_a = store.per_speaker().set_index('speaker').loc['A']
+        self.assertEqual(speaker_a['messages'], 2)
+        self.assertAlmostEqual(speaker_a['total_sentiment'], 0.2)
+        self.assertAlmostEqual(speaker_a['filler_words_ratio'], 0.25)
+        self.assertAlmostEqual(speaker_a['messages_per_turn'], 2.0)
+
+        # saved: a new store reads nothing, then only the new part
+        self.assertEqual(AggregateStore(results_dir).update(), [])
+        self.write_part(results_dir, 'b', [('B', 'ok', 'NEGATIVE', 0.5, 0.0)], '2026-10-02')
+        store = AggregateStore(results_dir)
+        self.assertEqual(store.update(), ['b.parquet'])
+        self.assertEqual(store.transcripts(), ['a', 'b'])
+        self.assertEqual(store.per_day()['messages'].tolist(), [3, 1])
+        self.assertEqual(len(store.compare(['b'])), 1)
+        os.remove(os.path.join(results_dir, 'a.parquet'))
+        store.update()
+        self.assertEqual(store.transcripts(), ['b'])
+
+    def test_day_is_the_batch_run_date(self):
+        import datetime
+        results_dir = self.enterContext(tempfile.TemporaryDirectory())
+        rows = [('A', 'hi', 'POSITIVE', 0.5, 0.0)]
+        self.write_part(results_dir, 'a', rows, '2026-10-01', run_date='2026-10-05')
+        # written before the run date was recorded
+        self.write_part(results_dir, 'b', rows, '2026-10-02')
+        store = AggregateStore(results_dir)
+        store.update()
+        self.assertEqual(store.per_day()['date'].tolist(),
+                         [datetime.date(2026, 10, 2), datetime.date(2026, 10, 5)])
+
+    def test_turns_across_batches(self):
+        results_dir = self.enterContext(tempfile.TemporaryDirectory())
+        rows = [(s, 'x', 'POSITIVE', 0.5, 0.0) for s in 'AABBBA']
+        self.write_part(results_dir, 'a', rows, '2026-10-01')
+        path = os.path.join(results_dir, 'a.parquet')
+        for batch_size in (1, 2, 4, 100):
+            self.assertEqual(part_partials(path, batch_size=batch_size)['turns'].sum(), 3)
+
+
+class TestInferenceWorker(unittest.TestCase):
+
+    def setUp(self):
+        self.spec = models.registry._specs["sentiment"]
+
+    def tearDown(self):
+        loader, name, version, config = self.spec
+        models.registry.register("sentiment", loader, name, version, **config)
+
+    def start_server(self):
+        import threading
+        address = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), 'inference.sock')
+        listener = inference.listen(address)
+        # removes the socket before its directory is
+        self.addCleanup(listener.close)
+        threading.Thread(target=inference.serve, args=(address,),
+                         kwargs=dict(max_wait_ms=200, warm_up=(), listener=listener),
+                         daemon=True).start()
+        return address
+
+    def test_concurrent_requests_are_micro_batched(self):
+        import threading
+        address = self.start_server()
+        client = inference.InferenceClient(address)
+        results = [None] * 4
+
+        def request(i):
+            results[i] = client.filler_ratios(["um so like", "well"], ['um', 'like'], 'fast')
+        threads = [threading.Thread(target=request, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = client.stats()
+        client.close()
+
+        self.assertEqual(results, [[2 / 3, 0.0]] * 4)
+        self.assertEqual(stats['served_requests'], 4)
+        # all four requests arrived within max_wait_ms: one batch of 8
+        self.assertEqual(stats['mean_batch_size'], 8)
+        self.assertEqual(stats['queued_messages'], 0)
+
+    def test_private_socket_and_authkey(self):
+        import multiprocessing
+        from multiprocessing.connection import Client
+        address = self.start_server()
+        self.assertEqual(os.stat(address).st_mode & 0o077, 0)
+        self.assertEqual(os.stat(address + '.key').st_mode & 0o077, 0)
+        with self.assertRaises(multiprocessing.AuthenticationError):
+            Client(address, family='AF_UNIX', authkey=b'not the key')
+        # the worker goes on serving the clients that have the key
+        client = inference.InferenceClient(address)
+        self.assertEqual(client.filler_ratios(["um hi"], ['um'], 'fast'), [0.5])
+        client.close()
+
+    def test_requests_run_the_model_they_name(self):
+        address = self.start_server()
+        loads = []
+
+        def loader(name, version=None, **config):
+            loads.append(version)
+            return lambda msgs, batch_size=None, truncation=None: [
+                {'label': 'POSITIVE', 'score': float(version)} for _ in msgs]
+        models.registry.register("sentiment", loader, "fake", version="1")
+        client = inference.InferenceClient(address)
+        self.assertEqual(client.sentiment(["hi"], ("fake", "2", {}))[0]['score'], 2.0)
+        self.assertEqual(client.sentiment(["hi"], ("fake", "2", {}))[0]['score'], 2.0)
+        self.assertEqual(client.sentiment(["hi"], ("fake", "1", {}))[0]['score'], 1.0)
+        self.assertEqual(loads, ["2", "1"])
+        client.close()
+
+    def test_timed_out_requests_are_not_kept(self):
+        address = self.start_server()
+        # the worker waits max_wait_ms (200) for more requests
+        client = inference.InferenceClient(address, timeout=0.01)
+        with self.assertRaises(TimeoutError):
+            client.filler_ratios(["um"], ['um'], 'fast')
+        self.assertEqual(client._pending, {})
+        # its late reply is dropped
+        client.timeout = 5
+        self.assertEqual(client.filler_ratios(["um hi"], ['um'], 'fast'), [0.5])
+        client.close()
+
+    def test_reconnects_after_the_worker_went_away(self):
+        import multiprocessing
+        section = {'inference_worker': 'true',
+                   'inference_socket': os.path.join(
+                       self.enterContext(tempfile.TemporaryDirectory()), 'inference.sock')}
+        # e.g. the emotion pool's processes are not ours to stop
+        others = set(multiprocessing.active_children())
+        try:
+            connecting = inference.configure(section, {})
+            # computed in this process while the worker starts
+            self.assertIsNone(inference.get_client())
+            connecting.join()
+            client = inference.get_client()
+            (worker,) = set(multiprocessing.active_children()) - others
+            worker.kill()
+            worker.join()
+            for _ in range(50):
+                if client.closed:
+                    break
+                time.sleep(0.1)
+            with self.assertRaises(ConnectionError):
+                client.filler_ratios(["um"], ['um'], 'fast')
+            # a new worker is started in place of the dead one (in the background)
+            self.assertIsNone(inference.get_client())
+            inference._connecting.join()
+            self.assertIsNot(inference.get_client(), client)
+            self.assertEqual(inference.get_client().filler_ratios(["um"], ['um'], 'fast'), [1.0])
+        finally:
+            inference.configure({})
+            for child in set(multiprocessing.active_children()) - others:
+                child.kill()
+
+
+class TestPerf(unittest.TestCase):
+
+    def tearDown(self):
+        perf.configure({})
+        perf.reset()
+
+    def test_disabled_is_noop(self):
+        perf.configure({})
+        with perf.stage("nothing"):
+            pass
+        self.assertEqual(perf.summary(), [])
+
+    def test_stage_timings(self):
+        perf.configure({'perf_enabled': 'true'})
+        with self.assertLogs('perf') as logs:
+            for _ in range(2):
+                with perf.stage("work", messages=3):
+                    pass
+        perf.count("messages", 3)
+        (row,) = perf.summary()
+        self.assertEqual((row['stage'], row['calls']), ("work", 2))
+        self.assertEqual(perf.counters(), {"messages": 3})
+        self.assertIn('"stage": "work"', logs.output[0])
+
+    def test_only_outermost_stage_is_profiled(self):
+        perf.configure({'perf_enabled': 'true', 'perf_profile': 'true'})
+        with self.assertLogs('perf') as logs:
+            with perf.stage("outer"):
+                with perf.stage("inner"):
+                    time.sleep(0.02)
+            perf.event("retry", stage="tagging")
+        self.assertEqual(list(perf.profiles()), ["outer"])
+        # the nested stage's work is in the outer report, which kept running
+        self.assertIn('time.sleep', perf.profiles()["outer"])
+        self.assertEqual([row['stage'] for row in perf.summary()], ["outer", "inner"])
+        self.assertIn('"event": "retry"', logs.output[-1])
+        with perf.stage("again"):
+            pass
+        self.assertIn("again", perf.profiles())
+
+    def test_throughput_is_logged_with_perf_disabled(self):
+        import cache
+        spec = models.registry._specs["sentiment"]
+        self.addCleanup(models.registry.register, "sentiment", spec[0], spec[1], spec[2], **spec[3])
+        models.registry.register("sentiment", _fake_sentiment_loader, "fake")
+        cache.configure({})
+        perf.configure({})
+        with self.assertLogs('analysis', 'DEBUG') as logs:
+            compute_sentiment("Speaker A: hi\nSpeaker B: um no\n", ['um'], filler_mode='fast')
+        self.assertRegex(logs.output[-1], r"analyzed 2 messages in \d+\.\d{3} s")
+
+
+class TestStartup(unittest.TestCase):
+
+    def test_startup_budget(self):
+        import configparser
+        # import app and app.setup() with the shipped config.ini, but its
+        # cache in a temporary directory rather than in the repo
+        tmp = self.enterContext(tempfile.TemporaryDirectory())
+        config = configparser.ConfigParser()
+        config.read('config.ini')
+        config['DEFAULT']['cache_file'] = os.path.join(tmp, 'cache.sqlite')
+        config_file = os.path.join(tmp, 'config.ini')
+        with open(config_file, 'w') as f:
+            config.write(f)
+        startup = measure_startup('app', config_file=config_file)
+        self.assertEqual(startup['heavy_modules'], [])
+        self.assertLess(startup['seconds'], STARTUP_BUDGET_S)
+
+
+class TestParsing(unittest.TestCase):
+
+    def test_skips_and_reports_malformed_lines(self):
+        errors = []
+        text = "Speaker A: hi\n\nno colon here\n: no speaker\nAgent 7: a: b\r\n"
+        turns = list(iter_conversation_turns(
+            text, on_error=lambda line_no, line: errors.append(line_no)))
+        self.assertEqual(turns, [Turn(0, 1, "Speaker A", " hi"),
+                                 Turn(1, 5, "Agent 7", " a: b")])
+        self.assertEqual(errors, [3, 4])
+
+    def test_file_matches_string(self):
+        with open('transcript.txt') as f:
+            text = f.read()
+        self.assertEqual(list(iter_file_turns('transcript.txt')),
+                         list(iter_conversation_turns(text)))
+        with tempfile.TemporaryDirectory() as tmp:
+            empty = os.path.join(tmp, 'empty.txt')
+            open(empty, 'w').close()
+            self.assertEqual(list(iter_file_turns(empty)), [])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -7,24 +7,26 @@ Description and Usage:
    Utility functions that should be accompanied with main files.
 """
 
-from langchain_groq import ChatGroq
-from langchain.schema import SystemMessage, HumanMessage
-import text2emotion as te
-import streamlit as st
-from dotenv import load_dotenv
+import functools
+import html
+import io
 import os
+import threading
+from collections import OrderedDict
+import streamlit as st
 import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
-from tags import TagOutput
-from langchain.chains import create_tagging_chain_pydantic
+import cache
+import inference
+import perf
+from models import get_model
+from analysis import add_emotions, compute_sentiment
+from analytics import AnalyticsFrame, get_analytics, put_analytics
+from aggregate import get_aggregates, METRICS
+from results import ResultTable
 
 def setup_llm():
-    load_dotenv()
-    api_key = os.getenv("Groq_API_KEY")
-    if not api_key:
-        raise ValueError("Missing Groq_API_KEY in environment variables.")
-    return ChatGroq(model="llama3-8b-8192", groq_api_key=api_key)
+    '''Returns the shared Groq chat client (created once, see models.py).'''
+    return get_model("groq")
 
 def read_fillers_from_file(file_path):
     '''Reads and returns all fillers in the given file at file_path.'''
@@ -40,27 +42,37 @@ def read_fillers_from_file(file_path):
         print(f"The file '{file_path}' was not found.")
         return []
 
+def sample_conversation_messages(topic=None):
+    '''Returns the prompt (system and human messages) asking the LLM for a
+    sample conversation, optionally about a given topic.'''
+    # imported here, so the LLM stack only loads when it is used
+    from langchain.schema import SystemMessage, HumanMessage
+    request = "Give a daily conversation between two people with at least 16 alternative talks. Please give different sentiments."
+    if topic:
+        request += f" The conversation is about {topic}."
+    return [
+        SystemMessage(content="""
+            you are a helpful assistant giving sample conversations with different sentiments (positive, neutral and negative) on daily conversation topics.
+
+            ## sample style :
+            - The following shows a sample conversation:
+               Speaker A: Hey, did you catch the game last night?
+               Speaker B: Yeah, I did! It was, like, really intense toward the end.
+               ...
+
+            ## Rules:
+            - include at least 3 filler words in each speaker's turn.
+            - speakers must be Speaker A and Speaker B
+            - avoid introductory text in response
+        """),
+        HumanMessage(content=request)
+    ]
+
 def gen_auto_sample_conversation():
     '''Generates a sample conversation using Groq's LLAMA model.'''
     try:
         llm = setup_llm()
-        messages = [
-            SystemMessage(content="""
-                you are a helpful assistant giving sample conversations with different sentiments (positive, neutral and negative) on daily conversation topics.
-
-                ## sample style :
-                - The following shows a sample conversation:
-                   Speaker A: Hey, did you catch the game last night?
-                   Speaker B: Yeah, I did! It was, like, really intense toward the end.
-                   ...
-
-                ## Rules:
-                - include at least 3 filler words in each speaker's turn.
-                - speakers must be Speaker A and Speaker B
-                - avoid introductory text in response
-            """),
-            HumanMessage(content="Give a daily conversation between two people with at least 16 alternative talks. Please give different sentiments.")
-        ]
+        messages = sample_conversation_messages()
         response = llm(messages)
         if not hasattr(response, 'content') or not response.content.strip():
             raise ValueError("Received an empty or invalid response from the language model.")
@@ -70,6 +82,10 @@ def gen_auto_sample_conversation():
 
 def load_conversation(auto_fill=False, file_path='transcript.txt'):
     '''Loads or generates a conversation.'''
+    with perf.stage("load_conversation", auto_fill=auto_fill):
+        return _load_conversation(auto_fill, file_path)
+
+def _load_conversation(auto_fill, file_path):
     if auto_fill:
         conversation = gen_auto_sample_conversation()
         with open(file_path, "w", encoding="utf-8") as f:
@@ -82,8 +98,339 @@ def load_conversation(auto_fill=False, file_path='transcript.txt'):
         except FileNotFoundError:
             print(f"Error: The file '{file_path}' was not found.")
 
-def render_and_visualize(inputs):
-    '''Visualizes conversation and analysis results using Streamlit.'''
+class TranscriptFollower:
+    '''Follows a transcript file that keeps growing (e.g. a live call).
+    It remembers how many bytes of the file were already analyzed, so
+    every update only reads and analyzes the complete lines appended
+    since the last one, appends their results to self.results (a
+    ResultTable) and extends self.analytics with them. Columns added to
+    the results later (see add_columns, e.g. the emotions) are computed for
+    the new messages only as well. A file that was truncated, rewritten or
+    replaced (rotated) is followed from the start.'''
+
+    # bytes before the offset kept to detect a rewritten file
+    TAIL_SIZE = 64
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self._lock = threading.Lock()
+        # {name: compute(results) -> results with more columns}
+        self._columns = {}
+        self._reset()
+
+    def _reset(self):
+        self.offset = 0
+        self.results = ResultTable.empty()
+        self.analytics = AnalyticsFrame(self.results)
+        # (device, inode, size, mtime) of the file at the last read, and
+        # the last bytes read
+        self._stat = None
+        self._tail = b''
+
+    def read_new_lines(self):
+        '''Returns the complete (newline terminated) lines appended since
+        the last call. A line still being written is left for next time.'''
+        try:
+            file = open(self.file_path, 'rb')
+        except FileNotFoundError:
+            print(f"Error: The file '{self.file_path}' was not found.")
+            return ''
+        with file:
+            stat = os.fstat(file.fileno())
+            if self._stat is not None:
+                if stat.st_size == self._stat[2] and stat.st_mtime_ns == self._stat[3] \
+                        and (stat.st_dev, stat.st_ino) == self._stat[:2]:
+                    # unchanged since the last read
+                    return ''
+                rewritten = False
+                if (stat.st_dev, stat.st_ino) != self._stat[:2] or stat.st_size < self.offset:
+                    rewritten = True
+                elif self._tail:
+                    file.seek(self.offset - len(self._tail))
+                    rewritten = file.read(len(self._tail)) != self._tail
+                if rewritten:
+                    # the file was truncated, rewritten or replaced, start over
+                    self._reset()
+            self._stat = (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+            file.seek(self.offset)
+            chunk = file.read(stat.st_size - self.offset)
+        end = chunk.rfind(b'\n') + 1
+        self.offset += end
+        self._tail = (self._tail + chunk[:end])[-self.TAIL_SIZE:]
+        lines = chunk[:end].decode('utf-8').splitlines()
+        return '\n'.join(line for line in lines if line.strip())
+
+    def update(self, filler_words, **kwargs):
+        '''Analyzes the new lines (kwargs go to compute_sentiment) and
+        returns the number of new results.'''
+        with self._lock:
+            conversation = self.read_new_lines()
+            if not conversation:
+                return 0
+            new_results = compute_sentiment(conversation, filler_words, **kwargs)
+            for compute in self._columns.values():
+                new_results = compute(new_results)
+            # a new table, so that results handed out before stay unchanged
+            self.results = self.results.append(new_results)
+            self.analytics = self.analytics.extend(new_results)
+            # render_and_visualize(self.results) then finds the frame
+            # without hashing the whole table
+            put_analytics(self.results, self.analytics)
+            return len(new_results)
+
+    def add_columns(self, name, compute, progress=None):
+        '''Adds the columns of compute(results, progress=None), which returns
+        results with more columns (e.g. add_emotions), to the results so far
+        (once per name) and from then on to the new results of every
+        update(), so they are never computed again for earlier messages.
+        Returns the results.'''
+        with self._lock:
+            if name not in self._columns:
+                self.results = compute(self.results, progress=progress)
+                # the frame gets new columns: built once more
+                self.analytics = AnalyticsFrame(self.results)
+                put_analytics(self.results, self.analytics)
+                self._columns[name] = compute
+            return self.results
+
+
+_followers = {}
+_followers_lock = threading.Lock()
+
+
+def get_follower(file_path):
+    '''Returns the TranscriptFollower of file_path. It is shared by all
+    sessions of the process, so a new session doesn't reanalyze the file.'''
+    with _followers_lock:
+        key = os.path.abspath(file_path)
+        if key not in _followers:
+            _followers[key] = TranscriptFollower(file_path)
+        return _followers[key]
+
+
+# options of render_and_visualize() that are drawn by draw_chart()
+CHART_OPTIONS = [
+    "Total Sentiment Score per Speaker",
+    "Count of Positive vs Negative",
+    "Sentiment Progression Over Time",
+    "Average Filler Word Ratio",
+    "Message Length vs. Sentiment Score",
+    "Speaker Turn-Taking Pattern",
+    "Sentiment Score Distribution",
+    "Average Sentiment per Turn",
+    "Emotion Breakdown per Speaker",
+]
+
+
+# above these sizes the charts draw a reduced series (see analytics.py)
+CHART_MAX_POINTS = 2000
+CHART_MAX_BARS = 100
+
+
+def _thin_ticks(ax, max_labels=25):
+    '''Keeps only about max_labels of the x tick labels of a bar chart.'''
+    labels = ax.get_xticklabels()
+    step = -(-len(labels) // max_labels)
+    for i, label in enumerate(labels):
+        label.set_visible(i % step == 0)
+
+
+def draw_chart(option, analytics, max_points=CHART_MAX_POINTS, max_bars=CHART_MAX_BARS):
+    '''Draws the chart of a dashboard option from an AnalyticsFrame
+    (see analytics.py) and returns the matplotlib figure.
+    Series longer than max_points are decimated or binned and turn charts
+    with more than max_bars turns show buckets of turns instead.'''
+    # plotting libraries are only imported once a chart is drawn
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    df = analytics.df
+    if option == "Total Sentiment Score per Speaker":
+        fig, ax = plt.subplots()
+        sns.barplot(data=analytics.per_speaker, x='speaker', y='sentiment_score', palette='coolwarm', ax=ax)
+        ax.axhline(0, color='black', linestyle='--')
+        ax.set_ylabel("Total Sentiment Score")
+    elif option == "Count of Positive vs Negative":
+        fig, ax = plt.subplots()
+        analytics.sentiment_counts.plot(kind='bar', stacked=True, ax=ax, colormap='coolwarm')
+        ax.set_ylabel("Message Count")
+    elif option == "Sentiment Progression Over Time":
+        fig, ax = plt.subplots()
+        # one marker per message only while they can still be told apart
+        sns.lineplot(data=analytics.progression(max_points), x='message_index', y='sentiment_score',
+                     hue='speaker', marker="o" if len(df) <= max_points else None,
+                     estimator=None, ax=ax)
+        ax.set_xlabel("Message Index")
+        ax.set_ylabel("Sentiment Score")
+    elif option == "Average Filler Word Ratio":
+        fig, ax = plt.subplots()
+        sns.barplot(data=analytics.per_speaker, x='speaker', y='filler_words_ratio', palette='Blues', ax=ax)
+        ax.set_ylabel("Avg. Filler Word Ratio")
+    elif option == "Message Length vs. Sentiment Score":
+        fig, ax = plt.subplots()
+        if len(df) > max_points:
+            df = df.sample(max_points, random_state=0)
+        sns.scatterplot(data=df, x='message_length', y='sentiment_score', hue='speaker', ax=ax)
+        ax.set_xlabel("Message Length (words)")
+        ax.set_ylabel("Sentiment Score")
+    elif option == "Speaker Turn-Taking Pattern":
+        fig, ax = plt.subplots()
+        turns, size = analytics.turn_buckets(analytics.turn_counts, 'count', max_bars)
+        sns.barplot(data=turns, x='turn', y='count', hue='speaker', dodge=size > 1, ax=ax)
+        ax.set_xlabel("Turn Index" if size == 1 else f"Turn Index (buckets of {size} turns)")
+        ax.set_ylabel("Messages in Turn")
+        _thin_ticks(ax)
+    elif option == "Sentiment Score Distribution":
+        fig, ax = plt.subplots()
+        if len(df) > max_points:
+            # the same histogram from 200 weighted bin centers per speaker
+            binned, edges = analytics.score_histogram(bins=200)
+            sns.histplot(data=binned, x='sentiment_score', weights='count', hue='speaker',
+                         kde=True, bins=len(edges) - 1, binrange=(edges[0], edges[-1]), ax=ax)
+        else:
+            sns.histplot(data=df, x='sentiment_score', hue='speaker', kde=True, bins=200, ax=ax)
+        ax.set_title("Distribution of Sentiment Scores")
+    elif option == "Average Sentiment per Turn":
+        fig, ax = plt.subplots(figsize=(10, 4))
+        turns, size = analytics.turn_buckets(analytics.turn_sentiment, 'sentiment_score', max_bars)
+        sns.barplot(data=turns, x='turn', y='sentiment_score', hue='speaker', dodge=size > 1, ax=ax)
+        ax.axhline(0, color='gray', linestyle='--')
+        ax.set_xlabel("Turn Index" if size == 1 else f"Turn Index (buckets of {size} turns)")
+        ax.set_ylabel("Avg. Sentiment Score")
+        ax.set_title("Average Sentiment per Turn")
+        _thin_ticks(ax)
+    elif option == "Emotion Breakdown per Speaker":
+        fig, ax = plt.subplots(figsize=(10, 5))
+        analytics.emotion_summary.set_index('speaker').T.plot(kind='bar', ax=ax)
+        ax.set_ylabel("Average Emotion Score")
+        ax.set_title("Emotion Breakdown by Speaker")
+        ax.legend(title='Speaker')
+    else:
+        raise ValueError(f"No chart for option '{option}'.")
+    return fig
+
+
+_charts = OrderedDict()
+_charts_lock = threading.Lock()
+_MAX_CHARTS = 32
+
+
+def render_chart(option, analytics, max_points=CHART_MAX_POINTS, max_bars=CHART_MAX_BARS):
+    '''Returns the chart of option as PNG bytes. Rendered charts are kept
+    (the last few, for all sessions) by the key of the analytics frame and
+    the option, so a rerun or going back to a chart doesn't draw it again.'''
+    key = (analytics.key, option, max_points, max_bars)
+    with _charts_lock:
+        if key in _charts:
+            _charts.move_to_end(key)
+            perf.count("chart_cache_hits")
+            return _charts[key]
+    import matplotlib.pyplot as plt
+    with perf.stage(f"chart[{option}]", messages=len(analytics.df)):
+        fig = draw_chart(option, analytics, max_points=max_points, max_bars=max_bars)
+        out = io.BytesIO()
+        fig.savefig(out, format='png', dpi=150, bbox_inches='tight')
+        plt.close(fig)
+    png = out.getvalue()
+    with _charts_lock:
+        _charts[key] = png
+        while len(_charts) > _MAX_CHARTS:
+            _charts.popitem(last=False)
+    return png
+
+
+def bubble_html(speaker, message, sentiment, score, filler_words_ratio, alignment):
+    '''Returns the HTML chat bubble of one message.'''
+    sentiment_color = {"POSITIVE": "limegreen", "NEGATIVE": "crimson", "NEUTRAL": "gray"}.get(sentiment.upper(), "black")
+    return (f"<div class='chat-bubble {alignment}'>"
+            f"<strong>{html.escape(speaker)}:</strong><br>{html.escape(message.strip())}"
+            f"<div class='meta'>"
+            f"<span style='color:{sentiment_color}'>Sentiment: {sentiment} ({score:.2f})</span><br>"
+            f"<span style='color:blue'>Filler Ratio: {filler_words_ratio:.2f}</span>"
+            f"</div></div>")
+
+
+def select_conversation_page(df, speakers=(), sentiments=(), query='', page_size=50,
+                             page=1, jump=None):
+    '''Selects what render_conversation() shows of the analytics frame df:
+    the messages of the given speakers and sentiments (all when empty)
+    whose text contains query, split in pages of page_size. The page is
+    clamped to the pages there are; with jump (a message index) it is the
+    page of the first match at or after that message instead.
+    Returns (rows, page, n_pages, page_rows): the index of all matches,
+    the page and number of pages, and the index of the page's messages.'''
+    mask = pd.Series(True, index=df.index)
+    if speakers:
+        mask &= df['speaker'].isin(speakers)
+    if sentiments:
+        mask &= df['sentiment'].isin(sentiments)
+    if query:
+        mask &= df['message'].str.contains(query, case=False, regex=False)
+    rows = df.index[mask.to_numpy()]
+
+    n_pages = max(1, -(-len(rows) // page_size))
+    if jump is not None:
+        page = int(rows.searchsorted(jump)) // page_size + 1
+    page = min(max(int(page), 1), n_pages)
+    return rows, page, n_pages, rows[(page - 1) * page_size:page * page_size]
+
+
+def _reset_conversation_page():
+    # the filters or the page size changed
+    st.session_state.conversation_page = 1
+
+
+def _take_conversation_jump():
+    # the jump is applied once by render_conversation() and the input
+    # cleared, so jumping to the same message again works
+    st.session_state.conversation_jump_to = st.session_state.conversation_jump
+    st.session_state.conversation_jump = None
+
+
+def render_conversation(analytics, page_sizes=(25, 50, 100)):
+    '''Shows the conversation one page at a time. Only the bubbles of the
+    visible page are built and sent (in one block), whatever the length
+    of the conversation. Messages can be filtered by speaker, sentiment
+    and text (see select_conversation_page), and the view can jump to a
+    message index.'''
+    df = analytics.df
+    col_speaker, col_sentiment, col_search = st.columns(3)
+    speakers = col_speaker.multiselect("Speaker", analytics.speakers,
+                                       on_change=_reset_conversation_page)
+    sentiments = col_sentiment.multiselect("Sentiment", sorted(df['sentiment'].unique()),
+                                           on_change=_reset_conversation_page)
+    query = col_search.text_input("Search messages", on_change=_reset_conversation_page)
+
+    col_size, col_jump, col_page = st.columns(3)
+    page_size = col_size.selectbox("Messages per page", page_sizes, index=1,
+                                   on_change=_reset_conversation_page)
+    col_jump.number_input("Jump to message #", min_value=0, max_value=max(len(df) - 1, 0),
+                          value=None, step=1, key='conversation_jump',
+                          on_change=_take_conversation_jump)
+    rows, page, n_pages, page_rows = select_conversation_page(
+        df, speakers, sentiments, query, page_size,
+        page=st.session_state.get('conversation_page', 1),
+        jump=st.session_state.pop('conversation_jump_to', None))
+    # the page widget is set from here, so this must run before it is drawn
+    st.session_state.conversation_page = page
+    page = col_page.number_input(f"Page (of {n_pages})", min_value=1, max_value=n_pages,
+                                 step=1, key='conversation_page')
+
+    visible = df.loc[page_rows]
+    first_speaker = analytics.speakers[0] if analytics.speakers else None
+    bubbles = [bubble_html(row.speaker, row.message, row.sentiment, row.score,
+                           row.filler_words_ratio,
+                           "left" if row.speaker == first_speaker else "right")
+               for row in visible.itertuples()]
+    st.caption(f"{len(rows)} of {len(df)} messages match, showing page {page} of {n_pages}.")
+    st.markdown("<div class='chat-container'>" + ''.join(bubbles) + "</div>",
+                unsafe_allow_html=True)
+
+
+def render_and_visualize(inputs, emotion_workers=None, chart_max_points=CHART_MAX_POINTS,
+                         chart_max_bars=CHART_MAX_BARS):
+    '''Visualizes conversation and analysis results using Streamlit.
+    emotion_workers is the number of processes used to compute emotions;
+    chart_max_points and chart_max_bars bound the size of the drawn charts.'''
     st.markdown("""
         <style>
         .chat-container { display: flex; flex-direction: column; }
@@ -96,34 +443,15 @@ def render_and_visualize(inputs):
 
     st.title("\U0001F4AC Conversation Viewer and Analysis")
     st.subheader("Conversation Display")
-    st.markdown("<div class='chat-container'>", unsafe_allow_html=True)
     show_opt = st.selectbox("Select Display Option", ["None", "Show Conversation"])
 
+    # built once per result set, with all derived columns and aggregates
+    analytics = get_analytics(inputs)
+
     if show_opt == "Show Conversation":
-        for entry in inputs:
-            speaker = entry['speaker']
-            message = entry['message'].strip()
-            sentiment = entry.get('sentiment', 'NEUTRAL')
-            score = entry.get('score', 0.0)
-            filler_words_ratio = entry.get('filler_words_ratio', 0.0)
-
-            alignment = "left" if speaker == "Speaker A" else "right"
-            sentiment_color = {"POSITIVE": "limegreen", "NEGATIVE": "crimson", "NEUTRAL": "gray"}.get(sentiment.upper(), "black")
-
-            bubble_html = f"""
-                <div class="chat-bubble {alignment}">
-                    <strong>{speaker}:</strong><br>{message}
-                    <div class="meta">
-                        <span style='color:{sentiment_color}'>Sentiment: {sentiment} ({score:.2f})</span><br>
-                        <span style='color:blue'>Filler Ratio: {filler_words_ratio:.2f}</span>
-                    </div>
-                </div>
-            """
-            st.markdown(bubble_html, unsafe_allow_html=True)
-
-    st.markdown("</div>", unsafe_allow_html=True)
-    df = pd.DataFrame(inputs)
-    df['sentiment_score'] = df.apply(lambda row: row['score'] if row['sentiment'] == 'POSITIVE' else -row['score'], axis=1)
+        render_conversation(analytics)
+
+    df = analytics.df
 
     st.subheader("Sentiment Analysis")
     options = st.selectbox("Select Analysis to Show", [
@@ -142,93 +470,104 @@ def render_and_visualize(inputs):
     ])
 
     if options == "Show Data Table":
-        st.dataframe(df)
-    elif options == "Total Sentiment Score per Speaker":
-        grouped = df.groupby('speaker')['sentiment_score'].sum().reset_index()
-        fig, ax = plt.subplots()
-        sns.barplot(data=grouped, x='speaker', y='sentiment_score', palette='coolwarm', ax=ax)
-        ax.axhline(0, color='black', linestyle='--')
-        ax.set_ylabel("Total Sentiment Score")
-        st.pyplot(fig)
-    elif options == "Count of Positive vs Negative":
-        count_df = df.groupby(['speaker', 'sentiment']).size().unstack(fill_value=0)
-        fig, ax = plt.subplots()
-        count_df.plot(kind='bar', stacked=True, ax=ax, colormap='coolwarm')
-        ax.set_ylabel("Message Count")
-        st.pyplot(fig)
-    elif options == "Sentiment Progression Over Time":
-        df['message_index'] = range(len(df))
-        fig, ax = plt.subplots()
-        sns.lineplot(data=df, x='message_index', y='sentiment_score', hue='speaker', marker="o", ax=ax)
-        ax.set_xlabel("Message Index")
-        ax.set_ylabel("Sentiment Score")
-        st.pyplot(fig)
-    elif options == "Average Filler Word Ratio":
-        filler_avg = df.groupby('speaker')['filler_words_ratio'].mean().reset_index()
-        fig, ax = plt.subplots()
-        sns.barplot(data=filler_avg, x='speaker', y='filler_words_ratio', palette='Blues', ax=ax)
-        ax.set_ylabel("Avg. Filler Word Ratio")
-        st.pyplot(fig)
-    elif options == "Message Length vs. Sentiment Score":
-        df['message_length'] = df['message'].apply(lambda x: len(x.split()))
-        fig, ax = plt.subplots()
-        sns.scatterplot(data=df, x='message_length', y='sentiment_score', hue='speaker', ax=ax)
-        ax.set_xlabel("Message Length (words)")
-        ax.set_ylabel("Sentiment Score")
-        st.pyplot(fig)
-    elif options == "Speaker Turn-Taking Pattern":
-        df['turn'] = (df['speaker'] != df['speaker'].shift()).cumsum()
-        turn_counts = df.groupby(['turn', 'speaker']).size().reset_index(name='count')
-        fig, ax = plt.subplots()
-        sns.barplot(data=turn_counts, x='turn', y='count', hue='speaker', dodge=False, ax=ax)
-        ax.set_xlabel("Turn Index")
-        ax.set_ylabel("Messages in Turn")
-        st.pyplot(fig)
-    elif options == "Sentiment Score Distribution":
-        fig, ax = plt.subplots()
-        sns.histplot(data=df, x='sentiment_score', hue='speaker', kde=True, bins=200, ax=ax)
-        ax.set_title("Distribution of Sentiment Scores")
-        st.pyplot(fig)
-    elif options == "Average Sentiment per Turn":
-        df['turn'] = (df['speaker'] != df['speaker'].shift()).cumsum()
-        turn_sentiment = df.groupby('turn').agg({'speaker': 'first', 'sentiment_score': 'mean'}).reset_index()
-        fig, ax = plt.subplots(figsize=(10, 4))
-        sns.barplot(data=turn_sentiment, x='turn', y='sentiment_score', hue='speaker', dodge=False, ax=ax)
-        ax.axhline(0, color='gray', linestyle='--')
-        ax.set_xlabel("Turn Index")
-        ax.set_ylabel("Avg. Sentiment Score")
-        ax.set_title("Average Sentiment per Turn")
-        st.pyplot(fig)
+        st.dataframe(analytics.table)
     elif options == "Emotion Breakdown per Speaker":
-        # uses text2emotion
-        df_emotions = df.copy()
-        df_emotions['emotions'] = df_emotions['message'].apply(te.get_emotion)
-        emotion_df = df_emotions['emotions'].apply(pd.Series)
-        df_emotions = pd.concat([df_emotions, emotion_df], axis=1)
-        emotion_cols = ['Happy', 'Angry', 'Surprise', 'Sad', 'Fear']
-        emotion_summary = df_emotions.groupby('speaker')[emotion_cols].mean().reset_index()
-        fig, ax = plt.subplots(figsize=(10, 5))
-        emotion_summary.set_index('speaker').T.plot(kind='bar', ax=ax)
-        ax.set_ylabel("Average Emotion Score")
-        ax.set_title("Emotion Breakdown by Speaker")
-        ax.legend(title='Speaker')
-        st.pyplot(fig)
+        # uses text2emotion; computed once (in parallel) and then kept
+        # in the results next to the sentiments
+        if not analytics.has_emotions:
+            bar = st.progress(0.0, text="Computing emotions...")
+
+            def progress(done, total):
+                bar.progress(done / total, text=f"Computing emotions... {done}/{total}")
+            pipeline = st.session_state.get('pipeline')
+            follower = st.session_state.get('follower')
+            if pipeline is not None and pipeline.results is inputs:
+                # kept up to date by the next "Re-analyze" too
+                inputs = pipeline.add_emotions(workers=emotion_workers, progress=progress)
+            elif follower is not None and follower.results is inputs:
+                # and by the next follow updates, for their new messages only
+                inputs = follower.add_columns(
+                    'emotions', functools.partial(add_emotions, workers=emotion_workers),
+                    progress=progress)
+            else:
+                inputs = add_emotions(inputs, workers=emotion_workers, progress=progress)
+            bar.empty()
+            st.session_state.results = inputs
+            analytics = get_analytics(inputs)
+        st.image(render_chart(options, analytics, chart_max_points, chart_max_bars))
+    elif options in CHART_OPTIONS:
+        st.image(render_chart(options, analytics, chart_max_points, chart_max_bars))
     elif options == "Conversation Taggings (takes time)":
         # an ability that overcome the limitation of text2emotion
         # since it can allow you specify the tags and sentimisent
         # for yourself (customized) 
-        full_text = ' '.join(df['message'].astype(str))
-        llm = setup_llm()
-        tagging_chain = create_tagging_chain_pydantic(TagOutput, llm)
-        run_properly = False
-        # Since llms are not deterministic (and not giving)
-        # what we want at once, it's inteded here to rerunn
-        # until we are happy with the output of the llm (Groq here)
-        while not run_properly:
-            try:
-                result = tagging_chain.run(full_text)
-                st.write(result)
-                run_properly = True
-            except:
-                print('Retrying tagging...')
-        print('Done!')
+        # Long conversations are tagged in windows (concurrently) and
+        # the window tags reduced into one, see tagging.py. Since llms are
+        # not deterministic (and not giving what we want at once), failed
+        # requests are retried with a growing delay.
+        from tagging import tag_conversation
+        try:
+            with st.spinner("Tagging the conversation..."):
+                result = tag_conversation(df['message'].astype(str))
+            st.write(result)
+        except Exception as e:
+            st.error(f"Tagging failed: {e}")
+
+    if perf.is_enabled():
+        render_performance()
+
+
+def render_comparison(results_dir):
+    '''Compares transcripts analyzed by batch.py (the Parquet parts in
+    results_dir) from the aggregates of aggregate.py, which are updated
+    with the parts written since the last rerun.'''
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    st.title("\U0001F4CA Transcript Comparison")
+    store = get_aggregates(results_dir)
+    transcripts = store.transcripts()
+    if not transcripts:
+        st.info(f"No results in '{results_dir}' yet, run batch.py first.")
+        return
+    selected = st.multiselect("Transcripts", transcripts, default=transcripts[:5])
+    metric = st.selectbox("Metric", METRICS, index=METRICS.index('mean_sentiment'))
+    if not selected:
+        return
+
+    table = store.compare(selected)
+    st.subheader(f"{metric} per transcript and speaker")
+    fig, ax = plt.subplots(figsize=(10, 0.4 * len(selected) + 2))
+    sns.barplot(data=table, y='transcript', x=metric, hue='speaker', orient='h', ax=ax)
+    st.pyplot(fig)
+    plt.close(fig)
+
+    st.subheader(f"{metric} per day (all transcripts)")
+    per_day = store.per_day()
+    fig, ax = plt.subplots(figsize=(10, 4))
+    ax.plot(pd.to_datetime(per_day['date']), per_day[metric], marker='o')
+    ax.set_ylabel(metric)
+    fig.autofmt_xdate()
+    st.pyplot(fig)
+    plt.close(fig)
+
+    st.subheader("Per speaker (all transcripts)")
+    st.dataframe(store.per_speaker())
+    st.subheader("Per transcript")
+    st.dataframe(store.per_transcript())
+
+    if perf.is_enabled():
+        render_performance()
+
+
+def render_performance():
+    '''Shows the per-stage timings, counters, cache and inference worker
+    stats and cProfile reports collected by perf.py in a "Performance" panel.'''
+    with st.expander("Performance"):
+        st.dataframe(pd.DataFrame(perf.summary()))
+        st.write({"counters": perf.counters(),
+                  "cache": cache.get_cache().stats() if cache.get_cache() else None,
+                  "inference_worker": inference.get_client().stats() if inference.get_client() else None})
+        for stage, report in perf.profiles().items():
+            st.text(stage)
+            st.code(report)